@@ -1,5 +1,22 @@
+import sys
+
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def register_sql_functions(sender, connection, **kwargs):
+    """SQL-функция decompress_text(): сжатый текст для триггеров SQLite."""
+    if connection.vendor == 'sqlite':
+        from .models import unpack
+        # deterministic появился в Python 3.8.
+        options = {'deterministic': True} if sys.version_info >= (3, 8) else {}
+        connection.connection.create_function(
+            'decompress_text', 1, unpack, **options,
+        )
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        connection_created.connect(register_sql_functions)
@@ -0,0 +1,192 @@
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import (FileResponse, Http404, HttpResponse,
+                         HttpResponseNotModified, StreamingHttpResponse)
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+from .storage import CONTENT_NAME
+
+HASHED_NAME = re.compile(r'^(?P<stem>.+)\.[0-9a-f]{12}(?P<ext>\.[^./]+)$')
+RANGE = re.compile(r'^bytes=(?P<start>\d*)-(?P<end>\d*)$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+CHUNK_SIZE = 64 * 1024
+
+
+def _join(root, path):
+    try:
+        return safe_join(root, path)
+    except SuspiciousFileOperation:
+        raise Http404
+
+
+def _resolve(root, path):
+    full_path = _join(root, path)
+    if not os.path.isfile(full_path):
+        raise Http404
+    return full_path
+
+
+def _byte_range(header, size):
+    """(start, end) из заголовка Range; None — отдать файл целиком.
+
+    Неверный заголовок (в том числе конец раньше начала) игнорируется,
+    как велит RFC 7233; верный диапазон за концом файла даёт start > end.
+    """
+    match = RANGE.match(header.strip())
+    if not match or not (match['start'] or match['end']):
+        return None
+    if not match['start']:
+        return max(size - int(match['end']), 0), size - 1
+    start = int(match['start'])
+    if match['end'] and int(match['end']) < start:
+        return None
+    end = min(int(match['end'] or size - 1), size - 1)
+    return start, end
+
+
+def _read_range(full_path, start, length):
+    with open(full_path, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            chunk = source.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _accepted_encodings(header):
+    """Кодировки из Accept-Encoding и их q; q=0 — явный запрет."""
+    accepted = {}
+    for item in header.split(','):
+        name, *params = (part.strip() for part in item.split(';'))
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    return accepted
+
+
+def _precompressed(request, full_path):
+    """Путь к предсжатой копии, которую примет клиент, и её кодировка.
+
+    Из допустимых копий берётся кодировка с наибольшим q, при равенстве —
+    первая в ENCODINGS.
+    """
+    accepted = _accepted_encodings(
+        request.META.get('HTTP_ACCEPT_ENCODING', '')
+    )
+    best_quality, best = 0, (full_path, None)
+    for encoding, suffix in ENCODINGS:
+        quality = accepted.get(encoding, accepted.get('*', 0))
+        if quality > best_quality and os.path.isfile(full_path + suffix):
+            best_quality, best = quality, (full_path + suffix, encoding)
+    return best
+
+
+def _file_response(full_path, size, range_header, content_type):
+    byte_range = range_header and _byte_range(range_header, size)
+    if byte_range is None:
+        return FileResponse(open(full_path, 'rb'), content_type=content_type)
+    start, end = byte_range
+    if start > end:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    response = StreamingHttpResponse(
+        _read_range(full_path, start, end - start + 1),
+        status=206, content_type=content_type,
+    )
+    response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = end - start + 1
+    return response
+
+
+def send_file(request, root, url, path, immutable=False):
+    """Отдаёт файл path из каталога root с кэш-заголовками, предсжатыми
+    копиями и Range.
+
+    С SENDFILE_BACKEND сами байты отдаёт фронт-сервер; для
+    X-Accel-Redirect путь строится от url — адреса каталога root на сайте.
+    """
+    full_path = _resolve(root, path)
+    stat = os.stat(full_path)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                              stat.st_mtime, stat.st_size):
+        return HttpResponseNotModified()
+    content_type, _ = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    range_header = request.META.get('HTTP_RANGE')
+    content_encoding = None
+    if not range_header:
+        full_path, content_encoding = _precompressed(request, full_path)
+        stat = os.stat(full_path)
+
+    if settings.SENDFILE_BACKEND == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = quote(full_path)
+    elif settings.SENDFILE_BACKEND == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        relative = os.path.relpath(full_path, root).replace(os.sep, '/')
+        response['X-Accel-Redirect'] = quote(
+            settings.SENDFILE_ACCEL_PREFIX + url + relative
+        )
+    else:
+        response = _file_response(full_path, stat.st_size, range_header,
+                                  content_type)
+        if response.status_code == 416:
+            return response
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if immutable:
+        response['Cache-Control'] = (
+            f'public, max-age={settings.IMMUTABLE_CACHE_MAX_AGE}, immutable'
+        )
+    else:
+        response['Cache-Control'] = (
+            f'public, max-age={settings.FILE_CACHE_MAX_AGE}'
+        )
+    response['Vary'] = 'Accept-Encoding'
+    if content_encoding:
+        response['Content-Encoding'] = content_encoding
+    return response
+
+
+def serve_media(request, path):
+    """Медиа; файлы с хэшем содержимого в имени не меняются никогда."""
+    return send_file(request, settings.MEDIA_ROOT, settings.MEDIA_URL, path,
+                     immutable=bool(re.search(CONTENT_NAME, path)))
+
+
+def serve_static(request, path):
+    """Статика; хэшированное имя отдаётся с кэшем «навсегда».
+
+    Если collectstatic не записал файл с хэшем, отдаётся исходный,
+    но только когда хэш совпадает с текущим содержимым.
+    """
+    match = HASHED_NAME.match(path)
+    if match and not os.path.isfile(_join(settings.STATIC_ROOT, path)):
+        original = match['stem'] + match['ext']
+        try:
+            stored = staticfiles_storage.stored_name(original)
+        except ValueError:
+            raise Http404
+        if stored != path:
+            raise Http404
+        path = original
+    return send_file(request, settings.STATIC_ROOT, settings.STATIC_URL,
+                     path, immutable=bool(match))
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.models import compressed_fields, decompress, unpack
+
+
+def stored_size(value):
+    return len(value.encode())
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает объём и время чтения полей с compressed(): '
+            'как хранится сейчас, без сжатия и со сжатием.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit', type=int, default=1000,
+            help='Сколько строк каждой модели замерять.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA page_count')
+                pages = cursor.fetchone()[0]
+                cursor.execute('PRAGMA page_size')
+                size = pages * cursor.fetchone()[0]
+            self.stdout.write(f'Файл базы: {size / 1024:.1f} КиБ')
+        for field in compressed_fields():
+            self.stdout.write(self.measure(field, options['limit']))
+
+    def measure(self, field, limit):
+        manager = field.model._default_manager
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT {quote(field.column)} '
+                f'FROM {quote(field.model._meta.db_table)} LIMIT %s',
+                [limit],
+            )
+            values = [value for value, in cursor.fetchall()
+                      if value is not None]
+        texts = [unpack(value) for value in values]
+        packed = [field.get_db_prep_save(text, connection) for text in texts]
+        started = time.perf_counter()
+        for row in manager.only('pk', field.name)[:limit]:
+            getattr(row, field.attname)
+        read = time.perf_counter() - started
+        started = time.perf_counter()
+        for value, text in zip(packed, texts):
+            if value != text:
+                decompress(value)
+        unpacking = time.perf_counter() - started
+        return (
+            f'{field.model._meta.label}.{field.name}: строк {len(values)}, '
+            f'сейчас {sum(map(stored_size, values)) / 1024:.1f} КиБ, '
+            f'без сжатия {sum(map(stored_size, texts)) / 1024:.1f} КиБ, '
+            f'со сжатием {sum(map(stored_size, packed)) / 1024:.1f} КиБ; '
+            f'чтение сейчас {read * 1000:.2f} мс, '
+            f'распаковка при полном сжатии {unpacking * 1000:.2f} мс'
+        )
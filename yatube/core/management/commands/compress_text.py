@@ -0,0 +1,59 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import Length
+
+from core.models import COMPRESSED_MARKER, compressed_fields
+
+
+class Command(BaseCommand):
+    help = ('Сжимает уже сохранённые длинные значения полей с compressed(); '
+            'можно запускать в фоне на живой базе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько строк переписывать в одной транзакции.',
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Пауза между пачками, секунд.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for field in compressed_fields():
+            model = field.model
+            min_length = (field.compression.min_length
+                          or settings.COMPRESSED_TEXT_MIN_LENGTH)
+            rows = model._default_manager.annotate(
+                stored_length=Length(field.name),
+            ).filter(stored_length__gte=min_length).exclude(
+                **{f'{field.name}__startswith': COMPRESSED_MARKER}
+            )
+            last_pk = rows.aggregate(last=Max('pk'))['last'] or 0
+            updated = 0
+            for start in range(0, last_pk + 1, batch_size):
+                batch = rows.filter(pk__gte=start, pk__lt=start + batch_size)
+                batch = list(batch.values_list('pk', field.name))
+                with transaction.atomic():
+                    for pk, text in batch:
+                        updated += self.compress_row(model, field, pk, text)
+                if batch and options['pause']:
+                    time.sleep(options['pause'])
+            self.stdout.write(f'{model._meta.label}.{field.name}: {updated}')
+        self.stdout.write(self.style.SUCCESS('Длинные тексты сжаты.'))
+
+    def compress_row(self, model, field, pk, text):
+        """Переписывает строку, только если текст не изменился с чтения.
+
+        Условие сравнивает хранимое значение без сжатия, а запись сжимает
+        его, поэтому правка, пришедшая между чтением и записью,
+        не затирается. Возвращает число переписанных строк.
+        """
+        return model._default_manager.filter(
+            pk=pk, **{field.name: text}
+        ).update(**{field.name: text})
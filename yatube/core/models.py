@@ -1,5 +1,12 @@
+import base64
+import zlib
+
+from django.apps import apps
+from django.conf import settings
 from django.db import models
 
+COMPRESSED_MARKER = 'zlib:'
+
 
 class CreatedModel(models.Model):
     """Абстрактная модель. Добавляет дату создания."""
@@ -10,3 +17,89 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class StoredFile(models.Model):
+    """Файл в хранилище с адресацией по содержимому и число ссылок на него."""
+    name = models.CharField('Имя файла', max_length=255, unique=True)
+    refs = models.PositiveIntegerField('Ссылок', default=0)
+
+    class Meta:
+        db_table = 'stored_files'
+        verbose_name = 'Файл'
+        verbose_name_plural = 'Файлы'
+
+    def __str__(self):
+        return self.name
+
+
+def compress(text):
+    packed = zlib.compress(text.encode())
+    return COMPRESSED_MARKER + base64.b64encode(packed).decode('ascii')
+
+
+def decompress(raw):
+    packed = base64.b64decode(raw[len(COMPRESSED_MARKER):])
+    return zlib.decompress(packed).decode()
+
+
+def unpack(value):
+    """Значение из БД как текст: сжатое распаковывается."""
+    if value is not None and value.startswith(COMPRESSED_MARKER):
+        return decompress(value)
+    return value
+
+
+class Compression:
+    """Сжатие длинных значений текстового поля; см. compressed()."""
+
+    def __init__(self, field, min_length=None):
+        self.field = field
+        self.min_length = min_length
+
+    def from_db_value(self, value, expression, connection):
+        return unpack(value)
+
+    def get_db_prep_save(self, value, connection):
+        value = type(self.field).get_db_prep_save(self.field, value,
+                                                  connection)
+        if value is None:
+            return value
+        if value.startswith(COMPRESSED_MARKER):
+            return compress(value)
+        min_length = self.min_length or settings.COMPRESSED_TEXT_MIN_LENGTH
+        if len(value) >= min_length:
+            packed = compress(value)
+            if len(packed) < len(value):
+                return packed
+        return value
+
+
+def compressed(field, min_length=None):
+    """Включает для TextField хранение длинных значений сжатыми zlib.
+
+    Значения от min_length символов (по умолчанию
+    COMPRESSED_TEXT_MIN_LENGTH) сжимаются при записи, если так короче,
+    и распаковываются при чтении, в том числе в values(). Условия
+    запросов сравниваются с тем, что хранится: поиск по подстроке
+    сжатые значения не находит.
+
+    Тип поля и схема не меняются, поэтому сжатие подключается к
+    экземпляру поля, а не подклассом. deconstruct() и clone() его
+    не переносят: модели в миграциях (apps.get_model) видят сжатые
+    значения как есть, с префиксом COMPRESSED_MARKER, и должны
+    распаковывать их через unpack().
+    """
+    field.compression = Compression(field, min_length)
+    for name in ('from_db_value', 'get_db_prep_save'):
+        setattr(field, name, getattr(field.compression, name))
+    return field
+
+
+def compressed_fields():
+    """Поля всех моделей, для которых включено compressed()."""
+    return [
+        field for model in apps.get_models()
+        for field in model._meta.local_fields
+        if hasattr(field, 'compression')
+    ]
@@ -0,0 +1,123 @@
+import gzip
+import hashlib
+import os
+import posixpath
+from functools import partial
+
+from django.contrib.staticfiles import storage
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import F
+
+from .models import StoredFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.svg', '.txt', '.html', '.json', '.map',
+                '.ico', '.xml')
+MIN_COMPRESS_SIZE = 256
+CONTENT_NAME = r'/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.[^/]*)?$'
+
+
+class ManifestStaticFilesStorage(storage.ManifestStaticFilesStorage):
+    """Статика с хэшем в имени и предсжатыми копиями .gz/.br рядом.
+
+    Файлы, которых нет в манифесте, хэшируются при первом обращении,
+    и результат запоминается до перезапуска процесса.
+    """
+    manifest_strict = False
+
+    def stored_name(self, name):
+        if name not in self.hashed_files:
+            try:
+                self.hashed_files[name] = super().stored_name(name)
+            except ValueError:
+                # Файла нет в STATIC_ROOT (не выполнен collectstatic).
+                return name
+        return self.hashed_files[name]
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed = set()
+        for name, hashed_name, result in super().post_process(
+                paths, dry_run, **options):
+            if not isinstance(result, Exception):
+                processed.update(filter(None, (name, hashed_name)))
+            yield name, hashed_name, result
+        if not dry_run:
+            for name in sorted(processed):
+                self.compress(name)
+
+    def compress(self, name):
+        if not name.endswith(COMPRESSIBLE):
+            return
+        with self.open(name) as source:
+            content = source.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+        siblings = {'.gz': gzip.compress(content, 9)}
+        if brotli is not None:
+            siblings['.br'] = brotli.compress(content)
+        for suffix, compressed in siblings.items():
+            if len(compressed) < len(content):
+                with open(self.path(name) + suffix, 'wb') as target:
+                    target.write(compressed)
+            elif os.path.exists(self.path(name) + suffix):
+                os.remove(self.path(name) + suffix)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище загрузок, где имя файла — хэш его содержимого.
+
+    posts/cat.jpg сохраняется как posts/3a/7b/3a7b…e1.jpg: каталоги
+    остаются небольшими, а одинаковые загрузки хранятся один раз.
+    StoredFile считает ссылки, файл удаляется с последней из них;
+    файлы без учёта ссылок (загруженные до хранилища) не удаляются.
+    """
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        return posixpath.join(
+            posixpath.dirname(name), digest[:2], digest[2:4],
+            digest + posixpath.splitext(name)[1].lower(),
+        )
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if not self.exists(name):
+            saved = super()._save(name, content)
+            if saved != name:
+                # Тот же файл параллельно записала другая загрузка.
+                super().delete(saved)
+        self.retain(name)
+        return name
+
+    def delete(self, name):
+        """Снимает ссылку, когда зафиксирована текущая транзакция.
+
+        При откате запись по-прежнему ссылается на файл, поэтому
+        ни счётчик, ни сам файл не трогаются.
+        """
+        transaction.on_commit(partial(self._delete, name))
+
+    def _delete(self, name):
+        if self.release(name):
+            super().delete(name)
+
+    def retain(self, name):
+        StoredFile.objects.bulk_create([StoredFile(name=name)],
+                                       ignore_conflicts=True)
+        StoredFile.objects.filter(name=name).update(refs=F('refs') + 1)
+
+    def release(self, name):
+        """Снимает ссылку; True, если на файл больше никто не ссылается."""
+        files = StoredFile.objects.filter(name=name)
+        with transaction.atomic():
+            if not files.filter(refs__gt=0).update(refs=F('refs') - 1):
+                return False
+            return files.filter(refs=0).delete()[0] > 0
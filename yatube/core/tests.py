@@ -0,0 +1,265 @@
+import gzip
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from posts.models import Comment, Post, User
+from posts.search import search
+from .management.commands.compress_text import (
+    Command as CompressTextCommand)
+from .models import COMPRESSED_MARKER, StoredFile
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+CONTENT = b'0123456789' * 100
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class FileServingTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(TEMP_MEDIA_ROOT, exist_ok=True)
+        with open(f'{TEMP_MEDIA_ROOT}/file.txt', 'wb') as file:
+            file.write(CONTENT)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_media_served_with_cache_headers(self):
+        response = self.client.get('/media/file.txt')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), CONTENT)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('max-age', response['Cache-Control'])
+        response = self.client.get(
+            '/media/file.txt',
+            HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_media_range(self):
+        ranges = {
+            'bytes=10-19': (206, 'bytes 10-19/1000', CONTENT[10:20]),
+            'bytes=-5': (206, 'bytes 995-999/1000', CONTENT[-5:]),
+            'bytes=990-': (206, 'bytes 990-999/1000', CONTENT[990:]),
+            'bytes=2000-': (416, 'bytes */1000', b''),
+            'bytes=5-3': (200, None, CONTENT),
+        }
+        for header, (status, content_range, body) in ranges.items():
+            with self.subTest(header=header):
+                response = self.client.get('/media/file.txt',
+                                           HTTP_RANGE=header)
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(response.get('Content-Range'), content_range)
+                content = (b''.join(response.streaming_content)
+                           if response.streaming else response.content)
+                self.assertEqual(content, body)
+
+    def test_precompressed_sibling(self):
+        with open(f'{TEMP_MEDIA_ROOT}/file.txt.gz', 'wb') as file:
+            file.write(gzip.compress(CONTENT))
+        response = self.client.get('/media/file.txt',
+                                   HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/plain')
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)), CONTENT
+        )
+
+    @override_settings(SENDFILE_BACKEND='x-accel-redirect')
+    def test_sendfile_handoff(self):
+        response = self.client.get('/media/file.txt')
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/internal/media/file.txt')
+        self.assertEqual(response.content, b'')
+
+    def test_sendfile_headers_quoted(self):
+        with open(f'{TEMP_MEDIA_ROOT}/файл.txt', 'wb') as file:
+            file.write(CONTENT)
+        with override_settings(SENDFILE_BACKEND='x-accel-redirect'):
+            response = self.client.get('/media/файл.txt')
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/internal/media/%D1%84%D0%B0%D0%B9%D0%BB.txt')
+        with override_settings(SENDFILE_BACKEND='x-sendfile'):
+            response = self.client.get('/media/файл.txt')
+        self.assertTrue(response['X-Sendfile'].endswith(
+            '/%D1%84%D0%B0%D0%B9%D0%BB.txt'
+        ))
+
+    @override_settings(SENDFILE_BACKEND='x-accel-redirect')
+    def test_sendfile_hashed_static_points_at_stored_file(self):
+        response = self.client.get(
+            staticfiles_storage.url('css/bootstrap.min.css')
+        )
+        prefix = '/internal/static/'
+        location = response['X-Accel-Redirect']
+        self.assertTrue(location.startswith(prefix))
+        self.assertTrue(os.path.isfile(
+            os.path.join(settings.STATIC_ROOT, location[len(prefix):])
+        ))
+
+    def test_precompressed_respects_q_values(self):
+        with open(f'{TEMP_MEDIA_ROOT}/file.txt.gz', 'wb') as file:
+            file.write(gzip.compress(CONTENT))
+        headers = {
+            'gzip;q=0, deflate': None,
+            'gzip; q=0.5': 'gzip',
+            '*': 'gzip',
+            '*, gzip;q=0': None,
+            'deflate': None,
+        }
+        for header, encoding in headers.items():
+            with self.subTest(header=header):
+                response = self.client.get('/media/file.txt',
+                                           HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(response.get('Content-Encoding'), encoding)
+
+    def test_path_traversal(self):
+        response = self.client.get('/media/../manage.py')
+        self.assertEqual(response.status_code, 404)
+
+    def test_hashed_static(self):
+        url = staticfiles_storage.url('css/bootstrap.min.css')
+        self.assertRegex(url, r'^/static/css/bootstrap\.min\.\w{12}\.css$')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(
+            '/static/css/bootstrap.min.000000000000.css'
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TransactionTestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_identical_uploads_stored_once(self):
+        first = default_storage.save('posts/a.TXT', ContentFile(CONTENT))
+        second = default_storage.save('posts/b.txt', ContentFile(CONTENT))
+        self.assertEqual(first, second)
+        self.assertRegex(first, r'^posts/(\w\w)/(\w\w)/\1\2\w{60}\.txt$')
+        self.assertEqual(StoredFile.objects.get(name=first).refs, 2)
+        default_storage.delete(first)
+        self.assertTrue(default_storage.exists(first))
+        default_storage.delete(first)
+        self.assertFalse(default_storage.exists(first))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_delete_waits_for_commit(self):
+        name = default_storage.save('posts/c.txt', ContentFile(CONTENT))
+        try:
+            with transaction.atomic():
+                default_storage.delete(name)
+                self.assertTrue(default_storage.exists(name))
+                raise DatabaseError
+        except DatabaseError:
+            pass
+        self.assertTrue(default_storage.exists(name))
+        self.assertEqual(StoredFile.objects.get(name=name).refs, 1)
+        with transaction.atomic():
+            default_storage.delete(name)
+            self.assertTrue(default_storage.exists(name))
+        self.assertFalse(default_storage.exists(name))
+
+    def test_untracked_file_kept(self):
+        os.makedirs(TEMP_MEDIA_ROOT, exist_ok=True)
+        with open(f'{TEMP_MEDIA_ROOT}/legacy.txt', 'wb') as file:
+            file.write(CONTENT)
+        default_storage.delete('legacy.txt')
+        self.assertTrue(default_storage.exists('legacy.txt'))
+
+
+@override_settings(COMPRESSED_TEXT_MIN_LENGTH=100)
+class CompressedTextTests(TestCase):
+    LONG_TEXT = 'Длинный комментарий. ' * 50
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def stored(self, comment):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT text FROM comments WHERE id = %s',
+                           [comment.pk])
+            return cursor.fetchone()[0]
+
+    def create(self, text):
+        return Comment.objects.create(post=self.post, author=self.user,
+                                      text=text)
+
+    def test_long_text_stored_compressed(self):
+        comment = self.create(self.LONG_TEXT)
+        self.assertTrue(self.stored(comment).startswith(COMPRESSED_MARKER))
+        self.assertLess(len(self.stored(comment)), len(self.LONG_TEXT))
+        comment = Comment.objects.get(pk=comment.pk)
+        self.assertEqual(comment.text, self.LONG_TEXT)
+        comment.save()
+        self.assertEqual(Comment.objects.get(pk=comment.pk).text,
+                         self.LONG_TEXT)
+        self.assertEqual(
+            list(Comment.objects.filter(pk=comment.pk).values('text')),
+            [{'text': self.LONG_TEXT}],
+        )
+
+    def test_long_post_compressed_and_searchable(self):
+        text = 'Длинный пост про сжатие. ' * 50 + 'редкослово'
+        post = Post.objects.create(author=self.user, text=text)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT text FROM posts WHERE id = %s', [post.pk])
+            self.assertTrue(cursor.fetchone()[0].startswith(
+                COMPRESSED_MARKER
+            ))
+        self.assertEqual(Post.objects.get(pk=post.pk).text, text)
+        if connection.vendor == 'sqlite':
+            self.assertEqual(list(search('редкослово')), [post])
+            post.text = 'Короткий'
+            post.save()
+            self.assertEqual(list(search('редкослово')), [])
+            self.assertEqual(list(search('Короткий')), [post])
+
+    def test_short_and_marker_texts_round_trip(self):
+        for text in ('Короткий', f'{COMPRESSED_MARKER}не сжатый'):
+            with self.subTest(text=text):
+                comment = self.create(text)
+                self.assertEqual(Comment.objects.get(pk=comment.pk).text,
+                                 text)
+        self.assertEqual(self.stored(Comment.objects.first()), 'Короткий')
+
+    def test_compress_text_command(self):
+        comment = self.create('Короткий')
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE comments SET text = %s WHERE id = %s',
+                           [self.LONG_TEXT, comment.pk])
+        call_command('compress_text', stdout=StringIO())
+        self.assertTrue(self.stored(comment).startswith(COMPRESSED_MARKER))
+        self.assertEqual(Comment.objects.get(pk=comment.pk).text,
+                         self.LONG_TEXT)
+        command = CompressTextCommand()
+        self.assertEqual(
+            command.compress_row(Comment, Comment._meta.get_field('text'),
+                                 comment.pk, 'Прочитанный раньше'), 0
+        )
+        self.assertEqual(Comment.objects.get(pk=comment.pk).text,
+                         self.LONG_TEXT)
+        out = StringIO()
+        call_command('bench_compression', stdout=out)
+        self.assertIn('posts.Comment.text', out.getvalue())
@@ -1,6 +1,16 @@
 from django.contrib import admin
+from django.contrib.admin.widgets import ForeignKeyRawIdWidget
 
 from .models import Group, Post, Follow, Comment
+from .paginators import EstimatedCountPaginator
+from .search import search_posts
+
+
+class ListRawIdWidget(ForeignKeyRawIdWidget):
+    """Поле id без подписи: не делает запрос на каждую строку списка."""
+
+    def label_and_url_for_value(self, value):
+        return '', ''
 
 
 @admin.register(Post)
@@ -14,21 +24,48 @@ class PostAdmin(admin.ModelAdmin):
         'group',
     )
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
     search_fields = ('text',)
     list_filter = ('created',)
+    date_hierarchy = 'created'
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist_formset(self, request, **kwargs):
+        kwargs['widgets'] = {'group': ListRawIdWidget(
+            Post._meta.get_field('group').remote_field, self.admin_site,
+        )}
+        return super().get_changelist_formset(request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search_posts(queryset, search_term), False
 
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
     list_display = ('title',)
+    search_fields = ('title', 'slug')
 
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
     list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('post', 'author', 'text')
+    list_select_related = ('post', 'author')
+    raw_id_fields = ('post', 'author')
+    date_hierarchy = 'created'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,58 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .thumbnails import enqueue, ready_pictures
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+CARD_KEY = 'post-card:{}:{}'
+
+
+def card_key(post):
+    """Ключ карточки: id поста и версия всего, что в ней показано."""
+    version = '|'.join(map(str, (
+        post.updated.timestamp() if post.updated else '',
+        post.author.username,
+        post.author.get_full_name(),
+        post.group.slug if post.group_id else '',
+    )))
+    return CARD_KEY.format(post.pk, hashlib.md5(version.encode()).hexdigest())
+
+
+def is_ready(post, pictures):
+    """Все ли миниатюры карточки уже построены."""
+    if not post.image:
+        return True
+    picture = pictures.get(post.image.name)
+    return bool(picture and picture.complete)
+
+
+def render_cards(posts):
+    """HTML карточек: одним get_many из кэша, рендерятся только промахи.
+
+    Миниатюры всех промахов читаются из хранилища sorl одним запросом.
+    Карточки, для которых воркер построил ещё не все миниатюры,
+    не кэшируются: updated поста после воркера не меняется.
+    """
+    keys = [card_key(post) for post in posts]
+    cards = cache.get_many(keys)
+    posts = {key: post for key, post in zip(keys, posts) if key not in cards}
+    pictures = ready_pictures(post.image for post in posts.values())
+    enqueue(*(name for name, picture in pictures.items()
+              if not (picture and picture.complete)))
+    missing = {
+        key: render_to_string(CARD_TEMPLATE, {
+            'post': post, 'picture': pictures.get(post.image.name),
+        })
+        for key, post in posts.items()
+    }
+    if missing:
+        cache.set_many({
+            key: card for key, card in missing.items()
+            if is_ready(posts[key], pictures)
+        }, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
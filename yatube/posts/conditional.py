@@ -0,0 +1,75 @@
+import hashlib
+from datetime import datetime, timezone
+
+from django.views.decorators.http import condition
+
+from . import page_cache
+from .models import Group
+
+
+def tags_version(*tags):
+    """Версия страницы по версиям её тегов в кэше страниц.
+
+    Версия тега — время последней записи в сущность (time_ns), поэтому
+    максимум версий годится и для Last-Modified: он не убывает, в том
+    числе после удаления комментария или отписки.
+    """
+    versions = page_cache.tag_versions(tags)
+    return {
+        'tags': sorted(zip(tags, versions)),
+        'last_modified': datetime.fromtimestamp(max(versions) / 10 ** 9,
+                                                timezone.utc),
+    }
+
+
+def post_version(request, post_id):
+    post = page_cache.post_entity(request, post_id)
+    return post and tags_version(
+        f'post:{post_id}', f'author:{post["author_id"]}',
+        f'group:{post["group__slug"]}',
+    )
+
+
+def profile_version(request, username):
+    author_id = page_cache.author_id(request, username)
+    return author_id and tags_version(f'author:{author_id}')
+
+
+def group_version(request, slug):
+    return (Group.objects.filter(slug=slug).exists()
+            and tags_version(f'group:{slug}'))
+
+
+def conditional_page(get_version):
+    """Отвечает 304 по ETag/Last-Modified до тяжёлых запросов и рендера.
+
+    get_version(request, *args, **kwargs) одним дешёвым запросом находит
+    сущность страницы и возвращает словарь с версиями её тегов и ключом
+    last_modified (или None, если сущности нет). Сущность ищется через
+    page_cache.lookup, поэтому теги кэша страниц её не ищут повторно.
+
+    Last-Modified не различает зрителей, поэтому отдаётся только гостям;
+    ETag учитывает зрителя и адрес страницы.
+    """
+    def version(request, *args, **kwargs):
+        if not hasattr(request, '_page_version'):
+            request._page_version = (
+                get_version(request, *args, **kwargs) or None
+            )
+        return request._page_version
+
+    def etag(request, *args, **kwargs):
+        data = version(request, *args, **kwargs)
+        if data is None:
+            return None
+        viewer = request.user.pk if request.user.is_authenticated else 'anon'
+        raw = f'{viewer}|{request.get_full_path()}|{sorted(data.items())}'
+        return hashlib.md5(raw.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        data = version(request, *args, **kwargs)
+        if data is None or request.user.is_authenticated:
+            return None
+        return data['last_modified']
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
@@ -0,0 +1,70 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, Stats
+
+User = get_user_model()
+
+
+def _shifted(field, delta):
+    """F(field) + delta, но не ниже нуля.
+
+    Счётчик мог разойтись с данными после bulk_create, update() или SQL;
+    уменьшение такого счётчика не должно нарушать CHECK (field >= 0).
+    """
+    if delta < 0:
+        return Greatest(F(field) + delta, 0)
+    return F(field) + delta
+
+
+def bump_user(user_id, **deltas):
+    """Сдвигает счётчики пользователя одним UPDATE с F()-выражениями.
+
+    У пользователей, созданных мимо save() (bulk_create, SQL), строки
+    счётчиков нет: при росте она создаётся пересчётом. Уменьшать
+    отсутствующую строку незачем — так бывает и при удалении самого
+    пользователя, когда его счётчики уже удалены.
+    """
+    updated = Stats.objects.filter(user_id=user_id).update(**{
+        field: _shifted(field, delta) for field, delta in deltas.items()
+    })
+    if not updated and any(delta > 0 for delta in deltas.values()):
+        recount_users(user_id, user_id + 1)
+
+
+def bump_post(post_id, delta):
+    if post_id is not None:
+        Post.objects.filter(id=post_id).update(
+            comments_count=_shifted('comments_count', delta)
+        )
+
+
+def _count(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by()
+        .values(field).annotate(total=Count('pk')).values('total')
+    ), Value(0))
+
+
+def recount_users(start, stop):
+    """Пересчитывает счётчики пользователей с pk из [start, stop)."""
+    users = User.objects.filter(pk__gte=start, pk__lt=stop)
+    Stats.objects.bulk_create(
+        [Stats(user_id=pk) for pk in users.values_list('pk', flat=True)],
+        ignore_conflicts=True,
+    )
+    return Stats.objects.filter(
+        user_id__gte=start, user_id__lt=stop
+    ).update(
+        posts_count=_count(Post.objects.all(), 'author'),
+        followers_count=_count(Follow.objects.all(), 'author'),
+        following_count=_count(Follow.objects.all(), 'user'),
+    )
+
+
+def recount_posts(start, stop):
+    """Пересчитывает число комментариев постов с pk из [start, stop)."""
+    return Post.objects.filter(pk__gte=start, pk__lt=stop).update(
+        comments_count=_count(Comment.objects.all(), 'post'),
+    )
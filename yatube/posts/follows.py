@@ -0,0 +1,100 @@
+from django.db import connection, transaction
+
+from . import counters, page_cache, timelines
+from .models import Follow
+
+
+class ViewerFollows:
+    """На кого из показанных авторов подписан зритель.
+
+    load() догружает ответы пачкой авторов одним запросом; уже известные
+    ответы не запрашиваются повторно.
+    """
+
+    def __init__(self, viewer):
+        self.viewer = viewer
+        self.known = {}
+
+    def load(self, authors):
+        missing = {author.pk for author in authors} - self.known.keys()
+        if not missing:
+            return self
+        followed = set()
+        if self.viewer.is_authenticated:
+            followed.update(Follow.objects.filter(
+                user=self.viewer, author_id__in=missing,
+            ).values_list('author_id', flat=True))
+        self.known.update((pk, pk in followed) for pk in missing)
+        return self
+
+    def __contains__(self, author):
+        return self.load([author]).known[author.pk]
+
+
+def viewer_follows(request):
+    """Подписки зрителя, общие для всех шаблонов одного запроса."""
+    if not hasattr(request, '_viewer_follows'):
+        request._viewer_follows = ViewerFollows(request.user)
+    return request._viewer_follows
+
+
+def _table():
+    quote = connection.ops.quote_name
+    return quote(Follow._meta.db_table), quote('user_id'), quote('author_id')
+
+
+def followed(user_id, author):
+    """Последствия новой подписки: счётчики, лента, кэш страниц."""
+    counters.bump_user(author.pk, followers_count=1)
+    counters.bump_user(user_id, following_count=1)
+    timelines.backfill(user_id, author)
+    page_cache.invalidate(f'author:{author.pk}', f'author:{user_id}')
+
+
+def unfollowed(user_id, author_id):
+    """Последствия отписки: счётчики, лента, кэш страниц."""
+    counters.bump_user(author_id, followers_count=-1)
+    counters.bump_user(user_id, following_count=-1)
+    timelines.trim(user_id, author_id)
+    timelines.shrunk(author_id, 'followers_count')
+    page_cache.invalidate(f'author:{author_id}', f'author:{user_id}')
+
+
+def follow(user, author):
+    """Подписывает одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Повторная подписка ничего не меняет; возвращает True,
+    если подписка появилась.
+    """
+    table, user_column, author_column = _table()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({user_column}, {author_column}) '
+                f'VALUES (%s, %s) '
+                f'ON CONFLICT ({user_column}, {author_column}) DO NOTHING',
+                [user.pk, author.pk],
+            )
+            created = cursor.rowcount == 1
+        if created:
+            followed(user.pk, author)
+    return created
+
+
+def unfollow(user, author):
+    """Отписывает одним DELETE; отсутствие подписки не ошибка.
+
+    Возвращает True, если подписка была.
+    """
+    table, user_column, author_column = _table()
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {table} '
+                f'WHERE {user_column} = %s AND {author_column} = %s',
+                [user.pk, author.pk],
+            )
+            deleted = cursor.rowcount > 0
+        if deleted:
+            unfollowed(user.pk, author.pk)
+    return deleted
@@ -0,0 +1,61 @@
+import base64
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps
+
+# Заглушка повторяет кадрирование миниатюры 960x339.
+PLACEHOLDER_SIZE = (16, 6)
+IMAGE_FIELDS = ('image_width', 'image_height', 'image_size',
+                'image_placeholder')
+
+
+def normalize(upload):
+    """Поворачивает картинку по EXIF, убирает метаданные и ужимает её.
+
+    Картинки без EXIF и в пределах POST_IMAGE_MAX_SIDE, а также
+    анимированные, сохраняются как есть.
+    """
+    image = Image.open(upload)
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    if (getattr(image, 'is_animated', False)
+            or not image.getexif() and max(image.size) <= max_side):
+        upload.seek(0)
+        return upload
+    format_ = image.format
+    params = {'format': format_}
+    if format_ == 'JPEG':
+        params.update(quality=90, optimize=True)
+    if 'icc_profile' in image.info:
+        params['icc_profile'] = image.info['icc_profile']
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    buffer = BytesIO()
+    image.save(buffer, **params)
+    return SimpleUploadedFile(upload.name, buffer.getvalue(),
+                              upload.content_type)
+
+
+def placeholder(image):
+    """Крошечная размытая копия картинки как data URI."""
+    tiny = ImageOps.fit(image.convert('RGB'), PLACEHOLDER_SIZE,
+                        Image.BILINEAR)
+    buffer = BytesIO()
+    tiny.save(buffer, format='PNG', optimize=True)
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+def describe(post):
+    """Заполняет размеры, вес и заглушку картинки поста."""
+    if not post.image:
+        post.image_width = post.image_height = post.image_size = None
+        post.image_placeholder = ''
+        return
+    post.image.seek(0)
+    with Image.open(post.image) as image:
+        post.image_width, post.image_height = image.size
+        post.image_placeholder = placeholder(image)
+    post.image.seek(0)
+    post.image_size = post.image.size
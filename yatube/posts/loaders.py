@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+
+from .models import Comment, Post
+from .paginators import CursorPaginator
+
+
+def comments_page(post_id, after=None):
+    """Страница комментариев по курсору (created, id), старые первыми.
+
+    Неразборчивый курсор — InvalidCursor, а не первая страница: иначе
+    подгрузка допишет под пост уже показанные комментарии.
+    """
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author'
+    ).only('id', 'text', 'created', 'post_id', 'author__username')
+    paginator = CursorPaginator(comments, settings.COMMENTS_PER_PAGE,
+                                ordering=('created', 'id'))
+    if after:
+        return paginator.cursor_page(after=after)
+    return paginator.first_page()
+
+
+def load_post_detail(post_id):
+    """Всё для страницы поста за два запроса.
+
+    Пост приходит вместе с автором, его счётчиками и группой,
+    вторым запросом — первая страница комментариев с авторами.
+    """
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id
+    )
+    return {
+        'post': post,
+        'author': post.author,
+        'comments': comments_page(post.id),
+    }
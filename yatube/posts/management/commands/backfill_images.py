@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from posts.images import IMAGE_FIELDS, describe
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Сохраняет размеры, вес и заглушки картинок существующих постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько постов обрабатывать за один запрос.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts = Post.objects.exclude(image='').filter(
+            image_width__isnull=True
+        ).only('id', 'image', *IMAGE_FIELDS)
+        last_pk = posts.aggregate(last=Max('pk'))['last'] or 0
+        updated = missing = 0
+        for start in range(0, last_pk + 1, batch_size):
+            batch = []
+            for post in posts.filter(pk__gte=start, pk__lt=start + batch_size):
+                try:
+                    describe(post)
+                except OSError:
+                    missing += 1
+                    continue
+                finally:
+                    post.image.close()
+                batch.append(post)
+            Post.objects.bulk_update(batch, IMAGE_FIELDS)
+            updated += len(batch)
+        self.stdout.write(f'Без файла: {missing}')
+        self.stdout.write(self.style.SUCCESS(f'Обновлено постов: {updated}'))
@@ -0,0 +1,64 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from posts.cards import CARD_TEMPLATE
+from posts.models import Post
+from posts.rows import feed_rows
+from posts.utils import N_POSTS_IN_PAGE
+
+ORDERING = ('-pub_date', '-id')
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает память и время страницы ленты: модели Post '
+            'против строк PostRow.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages', type=int, default=50,
+            help='Сколько раз строить страницу для каждого способа.',
+        )
+        parser.add_argument(
+            '--per-page', type=int, default=N_POSTS_IN_PAGE,
+            help='Сколько постов на странице.',
+        )
+
+    def handle(self, *args, **options):
+        if not Post.objects.exists():
+            self.stdout.write(self.style.WARNING('Нет постов для замера.'))
+            return
+        paths = (
+            ('Post', Post.objects.feed()),
+            ('PostRow', feed_rows(Post.objects.all())),
+        )
+        for name, queryset in paths:
+            memory, fetch, render = self.measure(
+                queryset.order_by(*ORDERING),
+                options['pages'], options['per_page'],
+            )
+            self.stdout.write(
+                f'{name}: память страницы {memory / 1024:.1f} КиБ, '
+                f'выборка {fetch * 1000:.2f} мс, '
+                f'рендер {render * 1000:.2f} мс'
+            )
+
+    def measure(self, queryset, pages, per_page):
+        """Средние на страницу: удерживаемая память, выборка, рендер."""
+        memory = fetch = render = 0
+        for _ in range(pages):
+            tracemalloc.start()
+            posts = list(queryset[:per_page])
+            memory += tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            started = time.perf_counter()
+            posts = list(queryset[:per_page])
+            fetch += time.perf_counter() - started
+            started = time.perf_counter()
+            for post in posts:
+                render_to_string(CARD_TEMPLATE,
+                                 {'post': post, 'picture': None})
+            render += time.perf_counter() - started
+        return memory / pages, fetch / pages, render / pages
@@ -0,0 +1,59 @@
+import os
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core.storage import CONTENT_NAME
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов в хранилище с адресацией '
+            'по содержимому.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=200,
+            help='Сколько постов переносить в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        legacy = (Post.objects.exclude(image='')
+                  .exclude(image__regex=CONTENT_NAME)
+                  .only('id', 'image').order_by('pk'))
+        last_pk = 0
+        moved = missing = 0
+        while True:
+            batch = list(legacy.filter(pk__gt=last_pk)
+                         [:options['batch_size']])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            renamed = {}
+            with transaction.atomic():
+                for post in batch:
+                    try:
+                        with default_storage.open(post.image.name) as file:
+                            name = default_storage.save(post.image.name,
+                                                        file)
+                    except (OSError, SuspiciousFileOperation):
+                        missing += 1
+                        continue
+                    Post.objects.filter(pk=post.pk).update(
+                        image=name, updated=timezone.now()
+                    )
+                    renamed[post.image.name] = name
+            for old in renamed:
+                if not Post.objects.filter(image=old).exists():
+                    try:
+                        os.remove(default_storage.path(old))
+                    except FileNotFoundError:
+                        pass
+            thumbnails.enqueue(*renamed.values())
+            moved += len(renamed)
+        self.stdout.write(f'Без файла: {missing}')
+        self.stdout.write(self.style.SUCCESS(f'Перенесено картинок: {moved}'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from posts.models import Post, PostSearch
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов по таблице posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--optimize', action='store_true',
+            help='После перестройки слить сегменты индекса.',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Индекс FTS5 есть только в SQLite.')
+        table = PostSearch._meta.db_table
+        posts = Post._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table}({table}) VALUES ('delete-all')"
+            )
+            cursor.execute(
+                f'INSERT INTO {table}(rowid, text) '
+                f'SELECT id, decompress_text(text) FROM {posts}'
+            )
+            if options['optimize']:
+                cursor.execute(
+                    f"INSERT INTO {table}({table}) VALUES ('optimize')"
+                )
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {PostSearch.objects.count()}'
+        ))
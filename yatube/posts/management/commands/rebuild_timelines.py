@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timelines
+from posts.models import Follow, TimelineEntry, TimelineRefill
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок с нуля.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.TIMELINE_BATCH_SIZE,
+            help='Сколько записей ленты вставлять за один запрос.',
+        )
+        parser.add_argument(
+            '--pending', action='store_true',
+            help='Только дозаполнить ленты авторов, опустившихся '
+                 'под пороги раскладки.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if options['pending']:
+            done = timelines.refill_pending(batch_size)
+            self.stdout.write(self.style.SUCCESS(
+                f'Дозаполнены ленты авторов: {done}'
+            ))
+            return
+        authors = User.objects.filter(
+            id__in=Follow.objects.values('author_id')
+        ).iterator()
+        with transaction.atomic():
+            TimelineEntry.objects.all().delete()
+            TimelineRefill.objects.all().delete()
+            for author in authors:
+                if timelines.fanout_on_read(author):
+                    continue
+                timelines.refill(author.id, batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f'Записей в лентах: {TimelineEntry.objects.count()}'
+        ))
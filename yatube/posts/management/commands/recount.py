@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from posts import counters
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает хранимые счётчики постов, комментариев и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк пересчитывать в одной транзакции.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        for model, recount in ((User, counters.recount_users),
+                               (Post, counters.recount_posts)):
+            last_pk = model.objects.aggregate(last=Max('pk'))['last'] or 0
+            updated = 0
+            for start in range(1, last_pk + 1, batch_size):
+                with transaction.atomic():
+                    updated += recount(start, start + batch_size)
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {updated}'
+            )
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны.'))
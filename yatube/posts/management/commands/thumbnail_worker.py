@@ -0,0 +1,87 @@
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts import thumbnails
+from posts.models import Post, ThumbnailJob
+
+
+def run_job(job):
+    """Возвращает задачу и текст ошибки (пустой, если всё получилось)."""
+    try:
+        thumbnails.generate(job.image)
+    except Exception as error:
+        return job, f'{type(error).__name__}: {error}'
+    return job, ''
+
+
+def run_threaded_job(job):
+    try:
+        return run_job(job)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры картинок постов вне цикла запроса.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.THUMBNAIL_WORKERS,
+            help='Сколько картинок обрабатывать параллельно.',
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=50,
+            help='Сколько задач забирать из очереди за раз.',
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Разобрать очередь и завершиться.',
+        )
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Поставить в очередь картинки всех существующих постов.',
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            names = (Post.objects.exclude(image='')
+                     .values_list('image', flat=True).distinct())
+            ThumbnailJob.objects.bulk_create(
+                (ThumbnailJob(image=name) for name in names.iterator()),
+                batch_size=options['batch_size'], ignore_conflicts=True,
+            )
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        done = failed = 0
+        with ThreadPoolExecutor(options['workers']) as pool:
+            if options['workers'] > 1:
+                process = partial(pool.map, run_threaded_job)
+            else:
+                process = partial(map, run_job)
+            while True:
+                jobs = thumbnails.claim(worker, options['batch_size'])
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(settings.THUMBNAIL_WORKER_POLL)
+                    continue
+                names = []
+                for job, error in process(jobs):
+                    if error:
+                        thumbnails.fail(job, error)
+                        self.stderr.write(f'{job.image}: {error}')
+                    else:
+                        names.append(job.image)
+                if names:
+                    thumbnails.finish(names)
+                done += len(names)
+                failed += len(jobs) - len(names)
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано картинок: {done}, с ошибкой: {failed}'
+        ))
@@ -0,0 +1,59 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Stats = apps.get_model('posts', 'Stats')
+    Post = apps.get_model('posts', 'Post')
+    users = User.objects.annotate(
+        posts_total=Count('posts', distinct=True),
+        followers_total=Count('following', distinct=True),
+        following_total=Count('follower', distinct=True),
+    ).iterator()
+    Stats.objects.bulk_create(
+        (Stats(user_id=user.pk,
+               posts_count=user.posts_total,
+               followers_count=user.followers_total,
+               following_count=user.following_total) for user in users),
+        batch_size=500,
+    )
+    posts = (Post.objects.annotate(total=Count('comments'))
+             .filter(total__gt=0).values_list('pk', 'total'))
+    for pk, total in posts.iterator():
+        Post.objects.filter(pk=pk).update(comments_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0002_timelines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Stats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Статистика пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+                'db_table': 'user_stats',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+import posts.models
+
+CREATE_SEARCH = (
+    """CREATE VIRTUAL TABLE posts_search USING fts5(
+        text, content='posts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER posts_search_insert AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_search(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER posts_search_delete AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_search(posts_search, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER posts_search_update AFTER UPDATE OF text ON posts BEGIN
+        INSERT INTO posts_search(posts_search, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_search(rowid, text) VALUES (new.id, new.text);
+    END""",
+    "INSERT INTO posts_search(posts_search) VALUES ('rebuild')",
+)
+DROP_SEARCH = (
+    'DROP TRIGGER IF EXISTS posts_search_insert',
+    'DROP TRIGGER IF EXISTS posts_search_delete',
+    'DROP TRIGGER IF EXISTS posts_search_update',
+    'DROP TABLE IF EXISTS posts_search',
+)
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_image_meta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearch',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search', serialize=False, to='posts.Post')),
+                ('text', posts.models.SearchField()),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'posts_search',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(run_sqlite(CREATE_SEARCH),
+                             run_sqlite(DROP_SEARCH)),
+    ]
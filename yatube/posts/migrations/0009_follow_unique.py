@@ -0,0 +1,51 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:34
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Q
+
+BATCH_SIZE = 500
+
+
+def dedupe_follows(apps, schema_editor):
+    """Оставляет по одной (самой ранней) подписке на пару user/author."""
+    Follow = apps.get_model('posts', 'Follow')
+    Stats = apps.get_model('posts', 'Stats')
+    duplicates = Follow.objects.values('user_id', 'author_id').annotate(
+        keep=Min('id'), total=Count('id'),
+    ).filter(total__gt=1).order_by()
+    users = set()
+    while True:
+        batch = list(duplicates[:BATCH_SIZE])
+        if not batch:
+            break
+        pairs = Q()
+        for row in batch:
+            pairs |= Q(user_id=row['user_id'], author_id=row['author_id'])
+            users.update((row['user_id'], row['author_id']))
+        Follow.objects.filter(pairs).exclude(
+            id__in=[row['keep'] for row in batch]
+        ).delete()
+    for user_id in users:
+        Stats.objects.filter(user_id=user_id).update(
+            followers_count=Follow.objects.filter(author_id=user_id).count(),
+            following_count=Follow.objects.filter(user_id=user_id).count(),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_created_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_follows, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['author', 'user'], name='follows_author_user_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='follows_user_author_uniq'),
+        ),
+    ]
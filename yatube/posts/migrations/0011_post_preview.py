@@ -0,0 +1,65 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:41
+
+from django.db import migrations, models
+from django.db.models import Max
+from django.utils.text import Truncator
+
+BATCH_SIZE = 500
+PREVIEW_LENGTH = 500
+
+# Добавление столбца в SQLite пересоздаёт таблицу posts вместе
+# с её триггерами, поэтому триггеры поиска из 0007 ставятся заново.
+SEARCH_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS posts_search_insert
+    AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_search(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_search_delete
+    AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_search(posts_search, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS posts_search_update
+    AFTER UPDATE OF text ON posts BEGIN
+        INSERT INTO posts_search(posts_search, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_search(rowid, text) VALUES (new.id, new.text);
+    END""",
+)
+
+
+def restore_search_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for statement in SEARCH_TRIGGERS:
+            schema_editor.execute(statement)
+
+
+def backfill_previews(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    posts = Post.objects.filter(preview='').exclude(text='').only('id', 'text')
+    last_pk = posts.aggregate(last=Max('pk'))['last'] or 0
+    for start in range(0, last_pk + 1, BATCH_SIZE):
+        batch = list(posts.filter(pk__gte=start, pk__lt=start + BATCH_SIZE))
+        for post in batch:
+            post.preview = Truncator(post.text).chars(PREVIEW_LENGTH)
+        Post.objects.bulk_update(batch, ['preview'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop,
+                             restore_search_triggers),
+        migrations.AddField(
+            model_name='post',
+            name='preview',
+            field=models.CharField(blank=True, editable=False, max_length=500, verbose_name='Превью'),
+        ),
+        migrations.RunPython(restore_search_triggers,
+                             migrations.RunPython.noop),
+        migrations.RunPython(backfill_previews, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:53
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_preview'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='thumbnailjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Попыток'),
+        ),
+        migrations.AddField(
+            model_name='thumbnailjob',
+            name='last_error',
+            field=models.TextField(blank=True, verbose_name='Последняя ошибка'),
+        ),
+        migrations.AddField(
+            model_name='thumbnailjob',
+            name='locked_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Взята в работу'),
+        ),
+        migrations.AddField(
+            model_name='thumbnailjob',
+            name='run_after',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Не раньше'),
+        ),
+        migrations.AddField(
+            model_name='thumbnailjob',
+            name='worker',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Воркер'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+from django.db import migrations
+
+# Тексты постов могут храниться сжатыми, поэтому индекс не читает
+# posts.text сам (content='posts'), а получает распакованный текст от
+# триггеров через decompress_text() — её регистрирует core.apps для
+# каждого соединения. Запись в posts вне Django (sqlite3 в консоли)
+# без этой функции невозможна.
+DROP_SEARCH = (
+    'DROP TRIGGER IF EXISTS posts_search_insert',
+    'DROP TRIGGER IF EXISTS posts_search_delete',
+    'DROP TRIGGER IF EXISTS posts_search_update',
+    'DROP TABLE IF EXISTS posts_search',
+)
+CREATE_SEARCH = DROP_SEARCH + (
+    """CREATE VIRTUAL TABLE posts_search USING fts5(
+        text, content='', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER posts_search_insert AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_search(rowid, text)
+        VALUES (new.id, decompress_text(new.text));
+    END""",
+    """CREATE TRIGGER posts_search_delete AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_search(posts_search, rowid, text)
+        VALUES ('delete', old.id, decompress_text(old.text));
+    END""",
+    """CREATE TRIGGER posts_search_update AFTER UPDATE OF text ON posts BEGIN
+        INSERT INTO posts_search(posts_search, rowid, text)
+        VALUES ('delete', old.id, decompress_text(old.text));
+        INSERT INTO posts_search(rowid, text)
+        VALUES (new.id, decompress_text(new.text));
+    END""",
+    """INSERT INTO posts_search(rowid, text)
+    SELECT id, decompress_text(text) FROM posts""",
+)
+# Откат возвращает индекс из 0007; сжатые тексты в нём не находятся.
+RESTORE_SEARCH = DROP_SEARCH + (
+    """CREATE VIRTUAL TABLE posts_search USING fts5(
+        text, content='posts', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER posts_search_insert AFTER INSERT ON posts BEGIN
+        INSERT INTO posts_search(rowid, text) VALUES (new.id, new.text);
+    END""",
+    """CREATE TRIGGER posts_search_delete AFTER DELETE ON posts BEGIN
+        INSERT INTO posts_search(posts_search, rowid, text)
+        VALUES ('delete', old.id, old.text);
+    END""",
+    """CREATE TRIGGER posts_search_update AFTER UPDATE OF text ON posts BEGIN
+        INSERT INTO posts_search(posts_search, rowid, text)
+        VALUES ('delete', old.id, old.text);
+        INSERT INTO posts_search(rowid, text) VALUES (new.id, new.text);
+    END""",
+    "INSERT INTO posts_search(posts_search) VALUES ('rebuild')",
+)
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == 'sqlite':
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_thumbnail_job_retries'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(CREATE_SEARCH),
+                             run_sqlite(RESTORE_SEARCH)),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0013_post_search_compressed_text'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineRefill',
+            fields=[
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='timeline_refill', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+            ],
+            options={
+                'verbose_name': 'Дозаполнение лент',
+                'verbose_name_plural': 'Дозаполнения лент',
+                'db_table': 'timeline_refills',
+            },
+        ),
+    ]
@@ -1,10 +1,34 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
+from django.utils.text import Truncator
 
-from core.models import CreatedModel
+from core.models import CreatedModel, compressed
+from .images import IMAGE_FIELDS, describe
 
 User = get_user_model()
 
+# Ленты показывают превью, полный текст поста в них не читается.
+PREVIEW_LENGTH = 500
+FEED_FIELDS = (
+    'id', 'preview', 'pub_date', 'updated', 'image', 'image_width',
+    'image_height', 'image_placeholder', 'author', 'group',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug',
+)
+
+
+def make_preview(text):
+    """Превью поста для лент: не длиннее PREVIEW_LENGTH символов."""
+    return Truncator(text).chars(PREVIEW_LENGTH)
+
+
+class PostQuerySet(models.QuerySet):
+
+    def feed(self):
+        """Посты для лент: автор и группа приходят в том же запросе."""
+        return self.select_related('author', 'group').only(*FEED_FIELDS)
+
 
 class Group(models.Model):
 
@@ -22,12 +46,16 @@ class Group(models.Model):
 
 
 class Post(CreatedModel):
-    text = models.TextField('Текст поста',
-                            help_text='Введите текст поста')
+    text = compressed(models.TextField('Текст поста',
+                                       help_text='Введите текст поста'))
+    preview = models.CharField(
+        'Превью', max_length=PREVIEW_LENGTH, blank=True, editable=False,
+    )
     pub_date = models.DateTimeField(
         'Дата публикации',
         auto_now_add=True,
         db_index=True,)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(
         get_user_model(),
         on_delete=models.CASCADE,
@@ -48,16 +76,95 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True
     )
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, editable=False,
+    )
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, editable=False,
+    )
+    image_size = models.PositiveIntegerField(
+        'Размер картинки, байт', null=True, editable=False,
+    )
+    image_placeholder = models.TextField(
+        'Заглушка картинки', blank=True, editable=False,
+    )
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False,
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         db_table = 'posts'
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['created'], name='posts_created_idx'),
+            models.Index(fields=['group', 'pub_date', 'id'],
+                         name='posts_group_feed_idx'),
+            models.Index(fields=['author', 'pub_date', 'id'],
+                         name='posts_author_feed_idx'),
+        ]
 
     def __str__(self) -> str:
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        derived = set()
+        if update_fields is None or 'text' in update_fields:
+            self.preview = make_preview(self.text)
+            derived.add('preview')
+        if ((update_fields is None or 'image' in update_fields)
+                and not (self.image and self.image._committed)):
+            describe(self)
+            derived.update(IMAGE_FIELDS)
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, *derived}
+        super().save(*args, **kwargs)
+
+
+class Match(models.Lookup):
+    """Полнотекстовое условие FTS5: столбец MATCH запрос."""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class SearchField(models.TextField):
+    """Столбец виртуальной таблицы FTS5."""
+
+
+SearchField.register_lookup(Match)
+
+
+class PostSearch(models.Model):
+    """Полнотекстовый индекс постов: виртуальная таблица FTS5.
+
+    Таблица и триггеры, которые держат её в согласии с posts,
+    создаются миграцией. Индекс бесконтентный: текст в нём не хранится
+    и столбец text читается как NULL.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.DO_NOTHING,
+        primary_key=True,
+        db_column='rowid',
+        related_name='search',
+    )
+    text = SearchField()
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_search'
+
 
 class Comment(CreatedModel):
     post = models.ForeignKey(
@@ -74,13 +181,18 @@ class Comment(CreatedModel):
         related_name='comments',
         verbose_name='Автор',
     )
-    text = models.TextField('Текст Комментария',
-                            help_text='Введите текст комментария')
+    text = compressed(models.TextField('Текст Комментария',
+                                       help_text='Введите текст комментария'))
 
     class Meta:
         db_table = 'comments'
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['created'], name='comments_created_idx'),
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comments_post_feed_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -104,6 +216,109 @@ class Follow(models.Model):
         db_table = 'follows'
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'author'],
+                                    name='follows_user_author_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['author', 'user'],
+                         name='follows_author_user_idx'),
+        ]
 
     def __str__(self):
         return self.user.username
+
+
+class Stats(models.Model):
+    """Счётчики пользователя, которые поддерживаются при записи."""
+    user = models.OneToOneField(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        db_table = 'user_stats'
+        verbose_name = 'Статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return str(self.user_id)
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post(),
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост',
+    )
+    author = models.ForeignKey(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        db_table = 'timelines'
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', 'pub_date', 'post'],
+                         name='timelines_user_feed_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class TimelineRefill(CreatedModel):
+    """Автор, чьи посты нужно заново разложить по лентам подписчиков."""
+    author = models.OneToOneField(
+        get_user_model(),
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='timeline_refill',
+        verbose_name='Автор',
+    )
+
+    class Meta:
+        db_table = 'timeline_refills'
+        verbose_name = 'Дозаполнение лент'
+        verbose_name_plural = 'Дозаполнения лент'
+
+    def __str__(self):
+        return str(self.author_id)
+
+
+class ThumbnailJob(CreatedModel):
+    """Картинка, для которой воркер ещё не построил миниатюры."""
+    image = models.CharField('Картинка', max_length=100, unique=True)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    run_after = models.DateTimeField('Не раньше', default=timezone.now)
+    locked_at = models.DateTimeField('Взята в работу', null=True, blank=True)
+    worker = models.CharField('Воркер', max_length=100, blank=True)
+
+    class Meta:
+        db_table = 'thumbnail_jobs'
+        verbose_name = 'Задача миниатюр'
+        verbose_name_plural = 'Задачи миниатюр'
+
+    def __str__(self):
+        return self.image
@@ -0,0 +1,192 @@
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from .models import Post
+
+User = get_user_model()
+
+TAG_KEY = 'page-tag:{}'
+PAGE_KEY = 'page:{}'
+LAST_PAGE_KEY = 'page-last:{}'
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def tag_versions(tags):
+    """Текущие версии тегов; отсутствующие теги получают новую версию."""
+    keys = [TAG_KEY.format(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def invalidate(*tags):
+    """Сбрасывает все страницы, помеченные хотя бы одним из тегов."""
+    cache.set_many(
+        {TAG_KEY.format(tag): _new_version() for tag in tags}, None
+    )
+
+
+def _page_hash(request, *parts):
+    scope = request.user.pk if request.user.is_authenticated else 'anon'
+    raw = '|'.join(map(str, (request.get_full_path(), scope, *parts)))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def page_key(request, tags):
+    return PAGE_KEY.format(_page_hash(request, *tags, *tag_versions(tags)))
+
+
+def last_page_key(request, tags):
+    """Ключ последней удачной копии страницы: без версий тегов,
+    поэтому переживает запись в её сущности."""
+    return LAST_PAGE_KEY.format(_page_hash(request, *tags))
+
+
+def _is_fresh(entry, beta):
+    """Вероятностное досрочное истечение (XFetch): чем дольше страница
+    строится, тем раньше до срока её начинают перестраивать."""
+    response, expires_at, delta = entry
+    jitter = -delta * beta * math.log(1 - random.random())
+    return time.time() + jitter < expires_at
+
+
+def _wait_for(key):
+    """Ждёт страницу от держателя замка; None, если её не будет."""
+    uncacheable_key = f'{key}:uncacheable'
+    deadline = time.monotonic() + settings.PAGE_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        found = cache.get_many([key, uncacheable_key])
+        if key in found:
+            return found[key]
+        if uncacheable_key in found:
+            return None
+        time.sleep(LOCK_POLL_INTERVAL)
+    return None
+
+
+def _is_cacheable(request, response):
+    return (request.method == 'GET' and response.status_code == 200
+            and not response.streaming and not response.cookies
+            and not request.META.get('CSRF_COOKIE_USED'))
+
+
+def cache_page_tagged(get_tags, timeout=None, stale=False):
+    """Кэширует страницу, пока не изменится ни одна из её сущностей.
+
+    get_tags(request, *args, **kwargs) возвращает теги сущностей,
+    показанных на странице: 'index', 'group:<slug>', 'author:<id>',
+    'post:<id>'. Запись в эти сущности сбрасывает тег через invalidate(),
+    поэтому срок жизни записи может быть долгим.
+
+    Страницу перестраивает один запрос под коротким замком в кэше,
+    остальные ждут его результата. С stale=True, пока идёт перестройка,
+    остальным отдаётся последняя удачная копия страницы — и после
+    истечения срока, и после записи, сменившей версии тегов; срок
+    истекает вероятностно чуть раньше назначенного. Если ответ держателя
+    замка нельзя кэшировать, он оставляет метку, и ждущие не ждут.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            ttl = settings.PAGE_CACHE_TIMEOUT if timeout is None else timeout
+            grace = settings.PAGE_CACHE_STALE_GRACE if stale else 0
+            beta = settings.PAGE_CACHE_EARLY_EXPIRY if stale else 0
+            tags = get_tags(request, *args, **kwargs)
+            key = page_key(request, tags)
+            last_key = last_page_key(request, tags)
+            entry = cache.get(key)
+            if entry is not None and _is_fresh(entry, beta):
+                return entry[0]
+            lock_key = f'{key}:lock'
+            locked = cache.add(lock_key, True,
+                               settings.PAGE_CACHE_LOCK_TIMEOUT)
+            if not locked:
+                entry = entry or (stale and cache.get(last_key))
+                entry = entry or _wait_for(key)
+                if entry is not None:
+                    return entry[0]
+            try:
+                started = time.monotonic()
+                response = view(request, *args, **kwargs)
+                delta = time.monotonic() - started
+                if _is_cacheable(request, response):
+                    entry = (response, time.time() + ttl, delta)
+                    keys = (key, last_key) if stale else (key,)
+                    cache.set_many(dict.fromkeys(keys, entry), ttl + grace)
+                elif locked:
+                    cache.set(f'{key}:uncacheable', True,
+                              settings.PAGE_CACHE_LOCK_TIMEOUT)
+                return response
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+        return wrapper
+    return decorator
+
+
+def index_tags(request):
+    return ['index']
+
+
+def group_tags(request, slug):
+    return [f'group:{slug}']
+
+
+def lookup(request, key, load):
+    """Результат load() один раз на запрос.
+
+    Теги страницы и её версия для условного GET ищут одну и ту же
+    сущность; второй поиск берёт ответ первого.
+    """
+    found = request.__dict__.setdefault('_page_lookups', {})
+    if key not in found:
+        found[key] = load()
+    return found[key]
+
+
+def author_id(request, username):
+    return lookup(request, ('author', username), lambda: (
+        User.objects.filter(username=username)
+        .values_list('pk', flat=True).first()
+    ))
+
+
+def post_entity(request, post_id):
+    """Автор и slug группы поста (или None, если поста нет)."""
+    return lookup(request, ('post', post_id), lambda: (
+        Post.objects.filter(pk=post_id)
+        .values('author_id', 'group__slug').first()
+    ))
+
+
+def profile_tags(request, username):
+    return [f'author:{author_id(request, username)}']
+
+
+def post_tags(request, post_id):
+    post = post_entity(request, post_id) or {}
+    return [
+        f'post:{post_id}',
+        f'author:{post.get("author_id")}',
+        f'group:{post.get("group__slug")}',
+    ]
+
+
+def comments_tags(request, post_id):
+    return [f'post:{post_id}']
@@ -0,0 +1,297 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, InvalidPage, Page, Paginator
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SEPARATOR = '|'
+FEED_COUNT_KEY = 'feed-count:{}'
+
+
+class CappedCount(int):
+    """Нижняя граница числа строк: показывается как «1000+»."""
+
+    def __str__(self):
+        return f'{int(self)}+'
+
+
+def exact_count(queryset):
+    """Точный COUNT(*): для небольших выборок."""
+    return queryset.count()
+
+
+def capped_count(limit=None):
+    """Считает не дальше limit строк: COUNT(*) по LIMIT limit + 1."""
+    limit = limit or settings.FEED_COUNT_CAP
+
+    def count(queryset):
+        total = queryset.order_by()[:limit + 1].count()
+        return CappedCount(limit) if total > limit else total
+    return count
+
+
+def cached_count(scope):
+    """Число строк из кэша; при промахе считается точно.
+
+    Значение поддерживается при записи через bump_cached_count. Когда
+    истекает FEED_COUNT_CACHE_TIMEOUT, COUNT(*) выполняет сам запрос,
+    попавший на промах, — в фоне ничего не пересчитывается.
+    """
+    def count(queryset):
+        key = FEED_COUNT_KEY.format(scope)
+        total = cache.get(key)
+        if total is None:
+            total = queryset.count()
+            cache.add(key, total, settings.FEED_COUNT_CACHE_TIMEOUT)
+        return total
+    return count
+
+
+def bump_cached_count(delta, *scopes):
+    """Сдвигает закэшированные счётчики; отсутствующие не создаются."""
+    for scope in scopes:
+        try:
+            cache.incr(FEED_COUNT_KEY.format(scope), delta)
+        except ValueError:
+            pass
+
+
+class InvalidCursor(InvalidPage):
+    """Курсор не разбирается: испорчен или устаревшего формата."""
+
+
+class CursorPage(Page):
+    """Страница, выбранная по курсору: без COUNT(*) и без OFFSET.
+
+    Номер страницы приходит в курсоре, поэтому номера соседних страниц
+    и индексы строк считаются без COUNT(*); после новых записей в ленту
+    они приблизительны.
+    """
+
+    def __init__(self, object_list, number, paginator, has_next,
+                 has_previous):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<CursorPage {self.number}>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def next_page_number(self):
+        if not self.has_next():
+            raise EmptyPage('Это последняя страница')
+        return self.number + 1
+
+    def previous_page_number(self):
+        if not self.has_previous():
+            raise EmptyPage('Это первая страница')
+        return self.number - 1
+
+    def start_index(self):
+        if not self.object_list:
+            return 0
+        return (self.number - 1) * self.paginator.per_page + 1
+
+    def end_index(self):
+        if not self.object_list:
+            return 0
+        return self.start_index() + len(self.object_list) - 1
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор с ключом (pub_date, id) и непрозрачными курсорами.
+
+    Страницы по курсору (?after=/?before=) стоят одинаково на любой
+    глубине. Обычные номера страниц (?page=N) обслуживаются базовым
+    Paginator и остаются рабочими; общее число строк для них даёт
+    counter (exact_count, cached_count, capped_count).
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id'), key=None, transform=None,
+                 counter=exact_count, **kwargs):
+        self.ordering = ordering
+        self.counter = counter
+        self.fields = [field.lstrip('-') for field in ordering]
+        self.descending = ordering[0].startswith('-')
+        self.key = key or (lambda obj: tuple(
+            getattr(obj, field) for field in self.fields
+        ))
+        self.transform = transform or list
+        super().__init__(object_list.order_by(*ordering), per_page,
+                         **kwargs)
+
+    @cached_property
+    def count(self):
+        return self.counter(self.object_list)
+
+    @property
+    def count_capped(self):
+        return isinstance(self.count, CappedCount)
+
+    def _get_page(self, object_list, number, paginator):
+        return super()._get_page(self.transform(object_list), number,
+                                 paginator)
+
+    def encode_cursor(self, obj, number):
+        """Курсор на строку obj со страницы number."""
+        value, pk = self.key(obj)
+        raw = CURSOR_SEPARATOR.join(
+            map(str, (value.isoformat(), pk, number))
+        )
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        """(значение, pk, номер страницы) из курсора или None."""
+        try:
+            padding = '=' * (-len(token) % 4)
+            raw = base64.urlsafe_b64decode(token + padding).decode()
+            value, pk, number = raw.split(CURSOR_SEPARATOR)
+            value = parse_datetime(value)
+            pk = int(pk)
+            number = int(number)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+        if value is None or number < 1:
+            return None
+        return value, pk, number
+
+    def _seek(self, key, forward):
+        value_field, pk_field = self.fields
+        value, pk = key
+        lookup = 'lt' if forward == self.descending else 'gt'
+        return Q(**{f'{value_field}__{lookup}': value}) | Q(
+            **{value_field: value, f'{pk_field}__{lookup}': pk}
+        )
+
+    def cursor_page(self, after=None, before=None):
+        """Возвращает страницу после (или до) позиции из курсора.
+
+        Без курсора отдаёт первую страницу; неразборчивый курсор —
+        InvalidCursor.
+        """
+        token = after or before
+        if not token:
+            return self.get_page(1)
+        cursor = self.decode_cursor(token)
+        if cursor is None:
+            raise InvalidCursor('Неверный курсор')
+        value, pk, number = cursor
+        queryset = self.object_list.filter(self._seek((value, pk),
+                                                      bool(after)))
+        if before:
+            reverse = [field[1:] if field.startswith('-') else f'-{field}'
+                       for field in self.ordering]
+            queryset = queryset.order_by(*reverse)
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = self.transform(rows[:self.per_page])
+        if after:
+            return CursorPage(rows, number + 1, self, has_next=has_more,
+                              has_previous=True)
+        rows.reverse()
+        return CursorPage(rows, max(number - 1, 1), self, has_next=True,
+                          has_previous=has_more)
+
+    def first_page(self):
+        """Первая страница без COUNT(*): для лент, листаемых курсором."""
+        rows = list(self.object_list[:self.per_page + 1])
+        return CursorPage(self.transform(rows[:self.per_page]), 1, self,
+                          has_next=len(rows) > self.per_page,
+                          has_previous=False)
+
+    def next_cursor(self, page):
+        if not len(page):
+            return ''
+        return self.encode_cursor(page[len(page) - 1], page.number)
+
+    def previous_cursor(self, page):
+        if not len(page):
+            return ''
+        return self.encode_cursor(page[0], page.number)
+
+    def has_more(self, page):
+        """Есть ли строки дальше: за последним номером при обрезанном
+        счётчике они тоже могут быть."""
+        return page.has_next() or (
+            not isinstance(page, CursorPage) and self.count_capped
+            and page.number == self.num_pages
+        )
+
+    def page_window(self, page, on_each_side=2, on_ends=1):
+        """Номера вокруг текущей страницы и по краям; None — пропуск.
+
+        Для обрезанного счётчика последняя страница неизвестна, поэтому
+        окно заканчивается пропуском. Страницы по курсору окна не
+        показывают: ему нужен COUNT(*).
+        """
+        if isinstance(page, CursorPage):
+            return []
+        last = self.num_pages
+        numbers = set(range(1, on_ends + 1))
+        numbers.update(range(max(page.number - on_each_side, 1),
+                             min(page.number + on_each_side, last) + 1))
+        if not self.count_capped:
+            numbers.update(range(last - on_ends + 1, last + 1))
+        window = []
+        for number in sorted(number for number in numbers if number > 0):
+            if window and number - window[-1] > 1:
+                window.append(None)
+            window.append(number)
+        if self.count_capped:
+            window.append(None)
+        return window
+
+
+def estimate_count(model):
+    """Число строк таблицы по статистике СУБД или None, если её нет.
+
+    В SQLite статистику пишет ANALYZE (sqlite_stat1); MAX(rowid) не
+    годится — он считает и удалённые строки.
+    """
+    if connection.vendor == 'sqlite':
+        sql = 'SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1'
+    elif connection.vendor == 'postgresql':
+        sql = ('SELECT reltuples::bigint FROM pg_class '
+               'WHERE oid = %s::regclass')
+    else:
+        return None
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [model._meta.db_table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None or row[0] is None:
+        return None
+    return max(int(str(row[0]).split()[0]), 0)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор без COUNT(*) по всей таблице.
+
+    Для выборки без фильтров число строк оценивается по статистике
+    СУБД; без статистики считается не дальше FEED_COUNT_CAP строк.
+    Отфильтрованные выборки считаются как обычно.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            estimate = estimate_count(self.object_list.model)
+            if estimate is not None:
+                return estimate
+            return capped_count()(self.object_list)
+        return super().count
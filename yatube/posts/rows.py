@@ -0,0 +1,159 @@
+from django.contrib.auth import get_user_model
+
+from .models import Group, Post
+
+User = get_user_model()
+
+# Столбцы карточки поста в ленте, в порядке полей PostRow.
+FEED_VALUES = (
+    'id', 'preview', 'pub_date', 'updated', 'image', 'image_width',
+    'image_height', 'image_placeholder',
+    'author_id', 'author__username', 'author__first_name',
+    'author__last_name', 'group_id', 'group__slug',
+)
+
+
+class Row:
+    """Строка только для чтения; равна строке или модели с тем же pk."""
+    __slots__ = ()
+    model = None
+
+    @property
+    def pk(self):
+        return self.id
+
+    def __eq__(self, other):
+        if isinstance(other, (type(self), self.model)):
+            return self.pk == other.pk
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.model, self.pk))
+
+
+class UserRow(Row):
+    __slots__ = ('id', 'username', 'first_name', 'last_name')
+    model = User
+
+    def __init__(self, id, username, first_name, last_name):
+        self.id = id
+        self.username = username
+        self.first_name = first_name
+        self.last_name = last_name
+
+    def __str__(self):
+        return self.username
+
+    def get_full_name(self):
+        return f'{self.first_name} {self.last_name}'.strip()
+
+
+class GroupRow(Row):
+    __slots__ = ('id', 'slug')
+    model = Group
+
+    def __init__(self, id, slug):
+        self.id = id
+        self.slug = slug
+
+    def __str__(self):
+        return self.slug
+
+
+class PostRow(Row):
+    """Пост в ленте: только то, что показывает карточка."""
+    __slots__ = ('id', 'preview', 'pub_date', 'updated', 'image_name',
+                 'image_width', 'image_height', 'image_placeholder',
+                 'author', 'group')
+    model = Post
+    image_field = Post._meta.get_field('image')
+
+    def __init__(self, id, preview, pub_date, updated, image_name,
+                 image_width, image_height, image_placeholder, author_id,
+                 username, first_name, last_name, group_id, group_slug):
+        self.id = id
+        self.preview = preview
+        self.pub_date = pub_date
+        self.updated = updated
+        self.image_name = image_name
+        self.image_width = image_width
+        self.image_height = image_height
+        self.image_placeholder = image_placeholder
+        self.author = UserRow(author_id, username, first_name, last_name)
+        self.group = group_id and GroupRow(group_id, group_slug)
+
+    def __str__(self):
+        return self.preview[:15]
+
+    @property
+    def author_id(self):
+        return self.author.id
+
+    @property
+    def group_id(self):
+        return self.group and self.group.id
+
+    @property
+    def image(self):
+        return self.image_field.attr_class(self, self.image_field,
+                                           self.image_name)
+
+
+class FeedRows:
+    """Выборка постов, которая отдаёт PostRow вместо моделей.
+
+    Фильтры, сортировка и срезы применяются к QuerySet постов; столбцы
+    карточки выбираются только при чтении строк, поэтому count() считает
+    посты без соединений с авторами и группами.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self._rows = None
+
+    @property
+    def model(self):
+        return self.queryset.model
+
+    @property
+    def query(self):
+        return self.queryset.query
+
+    @property
+    def ordered(self):
+        return self.queryset.ordered
+
+    def filter(self, *args, **kwargs):
+        return FeedRows(self.queryset.filter(*args, **kwargs))
+
+    def order_by(self, *fields):
+        return FeedRows(self.queryset.order_by(*fields))
+
+    def count(self):
+        if self._rows is not None:
+            return len(self._rows)
+        return self.queryset.count()
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return FeedRows(self.queryset[key])
+        return PostRow(*self.queryset.values_list(*FEED_VALUES)[key])
+
+    def _fetch(self):
+        if self._rows is None:
+            self._rows = [
+                PostRow(*values)
+                for values in self.queryset.values_list(*FEED_VALUES)
+            ]
+        return self._rows
+
+    def __iter__(self):
+        return iter(self._fetch())
+
+    def __len__(self):
+        return len(self._fetch())
+
+
+def feed_rows(queryset):
+    """Посты queryset строками PostRow."""
+    return FeedRows(queryset)
@@ -0,0 +1,39 @@
+import re
+
+from django.db import connection
+
+from .models import Post
+
+WORD = re.compile(r'\w+')
+
+
+def match_query(query):
+    """Запрос FTS5 из пользовательского ввода: все слова, по префиксу.
+
+    Слова берутся в кавычки, поэтому синтаксис FTS5 во вводе
+    (AND, NEAR, *, двоеточия) не интерпретируется.
+    """
+    return ' '.join(f'"{word}"*' for word in WORD.findall(query))
+
+
+def search_posts(queryset, query):
+    """Посты, подходящие под запрос, от самых релевантных."""
+    match = match_query(query)
+    if not match:
+        return queryset.none()
+    if connection.vendor != 'sqlite':
+        for word in WORD.findall(query):
+            queryset = queryset.filter(text__icontains=word)
+        return queryset
+    return queryset.filter(search__text__match=match).order_by(
+        'search__rank', '-pub_date', '-id'
+    )
+
+
+def search(query, group=None, author=None):
+    posts = Post.objects.feed()
+    if group:
+        posts = posts.filter(group__slug=group)
+    if author:
+        posts = posts.filter(author__username=author)
+    return search_posts(posts, query)
@@ -0,0 +1,151 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from . import counters, follows, page_cache, timelines
+from .models import Comment, Follow, Group, Post, Stats
+from .paginators import bump_cached_count
+
+User = get_user_model()
+USER_DISPLAY_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        Stats.objects.get_or_create(user=instance)
+
+
+def user_display(user):
+    """Поля пользователя, которые видны на страницах с его постами."""
+    return tuple(user.__dict__.get(name) for name in USER_DISPLAY_FIELDS)
+
+
+@receiver(post_init, sender=User)
+def user_loaded(sender, instance, **kwargs):
+    instance._initial_display = user_display(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    tags = [f'author:{instance.pk}']
+    if not created and instance._initial_display != user_display(instance):
+        slugs = (Group.objects.filter(posts__author=instance)
+                 .values_list('slug', flat=True).distinct())
+        post_ids = (Comment.objects.filter(author=instance).order_by()
+                    .values_list('post_id', flat=True).distinct())
+        tags += ['index', *(f'group:{slug}' for slug in slugs),
+                 *(f'post:{post_id}' for post_id in post_ids)]
+    page_cache.invalidate(*tags)
+    instance._initial_display = user_display(instance)
+
+
+@receiver(post_init, sender=Post)
+def post_loaded(sender, instance, **kwargs):
+    instance._initial_group_id = instance.__dict__.get('group_id')
+    instance._initial_author_id = instance.__dict__.get('author_id')
+    instance._initial_image = instance.__dict__.get('image')
+
+
+def group_scopes(*group_ids):
+    return [f'group:{pk}' for pk in group_ids if pk is not None]
+
+
+def invalidate_post_pages(post):
+    group_ids = {post._initial_group_id, post.group_id} - {None}
+    author_ids = {post._initial_author_id, post.author_id} - {None}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list('slug',
+                                                               flat=True)
+    page_cache.invalidate(
+        'index', f'post:{post.pk}',
+        *(f'author:{author_id}' for author_id in author_ids),
+        *(f'group:{slug}' for slug in slugs),
+    )
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.bump_user(instance.author_id, posts_count=1)
+        bump_cached_count(1, 'index', *group_scopes(instance.group_id))
+        timelines.fan_out(instance)
+    else:
+        if instance._initial_image not in (None, '', instance.image.name):
+            instance.image.storage.delete(instance._initial_image)
+        if instance._initial_group_id != instance.group_id:
+            bump_cached_count(-1, *group_scopes(instance._initial_group_id))
+            bump_cached_count(1, *group_scopes(instance.group_id))
+        if instance._initial_author_id != instance.author_id:
+            counters.bump_user(instance._initial_author_id, posts_count=-1)
+            counters.bump_user(instance.author_id, posts_count=1)
+            timelines.reassign(instance)
+            timelines.shrunk(instance._initial_author_id, 'posts_count')
+    instance._initial_image = instance.image.name
+    invalidate_post_pages(instance)
+    instance._initial_group_id = instance.group_id
+    instance._initial_author_id = instance.author_id
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.bump_user(instance.author_id, posts_count=-1)
+    timelines.shrunk(instance.author_id, 'posts_count')
+    bump_cached_count(-1, 'index', *group_scopes(instance.group_id))
+    if instance.image:
+        instance.image.delete(save=False)
+    invalidate_post_pages(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.bump_post(instance.post_id, 1)
+    page_cache.invalidate(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.bump_post(instance.post_id, -1)
+    page_cache.invalidate(f'post:{instance.post_id}')
+
+
+@receiver(post_init, sender=Group)
+def group_loaded(sender, instance, **kwargs):
+    instance._initial_slug = instance.__dict__.get('slug')
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    tags = [f'group:{instance._initial_slug}', f'group:{instance.slug}']
+    if not created and instance._initial_slug != instance.slug:
+        authors = (instance.posts.order_by()
+                   .values_list('author_id', flat=True).distinct())
+        tags += ['index', *(f'author:{author_id}' for author_id in authors)]
+    page_cache.invalidate(*tags)
+    instance._initial_slug = instance.slug
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    authors = (instance.posts.order_by().values_list('author_id', flat=True)
+               .distinct())
+    page_cache.invalidate(
+        'index', f'group:{instance.slug}',
+        *(f'author:{author_id}' for author_id in authors),
+    )
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        follows.followed(instance.user_id, instance.author)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    follows.unfollowed(instance.user_id, instance.author_id)
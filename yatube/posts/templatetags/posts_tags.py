@@ -0,0 +1,72 @@
+from django import template
+
+from posts.cards import render_cards
+from posts.follows import viewer_follows as load_viewer_follows
+from posts.thumbnails import enqueue, ready_picture, thumbnail_size
+
+register = template.Library()
+
+PAGE_PARAMS = ('page', 'after', 'before')
+
+
+@register.filter
+def next_cursor(page):
+    return page.paginator.next_cursor(page)
+
+
+@register.filter
+def previous_cursor(page):
+    return page.paginator.previous_cursor(page)
+
+
+@register.filter
+def has_more(page):
+    return page.paginator.has_more(page)
+
+
+@register.filter
+def page_window(page):
+    return page.paginator.page_window(page)
+
+
+@register.simple_tag(takes_context=True)
+def page_query(context, **params):
+    """Строка запроса текущей страницы с другими параметрами пагинации.
+
+    <a href="?{% page_query after=page_obj|next_cursor %}">
+    """
+    query = context['request'].GET.copy()
+    for name in PAGE_PARAMS:
+        query.pop(name, None)
+    query.update(params)
+    return query.urlencode()
+
+
+@register.simple_tag
+def post_cards(page):
+    return render_cards(list(page))
+
+
+@register.simple_tag
+def post_picture(image):
+    """Готовая миниатюра с вариантами или None; недостающую строит воркер."""
+    picture = ready_picture(image)
+    if image and not (picture and picture.complete):
+        enqueue(image.name)
+    return picture
+
+
+@register.simple_tag
+def picture_size(post):
+    """Размер миниатюры поста по сохранённым image_width/image_height."""
+    return thumbnail_size(post.image_width, post.image_height)
+
+
+@register.simple_tag(takes_context=True)
+def viewer_follows(context, *authors):
+    """Подписки зрителя; переданные авторы загружаются одним запросом.
+
+    {% viewer_follows author1 author2 as follows %}
+    {% if author in follows %}...{% endif %}
+    """
+    return load_viewer_follows(context['request']).load(authors)
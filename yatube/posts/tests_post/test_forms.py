@@ -1,14 +1,25 @@
+import os
 import shutil
 import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
+from PIL import Image
+from sorl.thumbnail import default
 
-from ..models import Post, Group, Comment, User
+from .. import thumbnails
+from ..cards import card_key, render_cards
+from ..models import Post, Group, Comment, ThumbnailJob, User
 
 
+ORIENTATION = 0x0112
 USER_NAME = 'auth'
 CREATE_POST_PAGE = reverse('posts:post_create')
 PROFILE_PAGE = reverse('posts:profile',
@@ -76,7 +87,162 @@ class PostCreateFormTests(TestCase):
         latest_post = Post.objects.latest('id')
         self.assertTrue(latest_post.text == 'Новый пост')
         self.assertTrue(latest_post.group == self.group)
-        self.assertTrue(latest_post.image == 'posts/small.gif')
+        self.assertRegex(latest_post.image.name,
+                         r'^posts/\w\w/\w\w/\w{64}\.gif$')
+
+    def test_thumbnail_built_by_worker(self):
+        cache.clear()
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 400)).save(buffer, format='PNG')
+        uploaded = SimpleUploadedFile(
+            name='thumb.png',
+            content=buffer.getvalue(),
+            content_type='image/png'
+        )
+        self.authorized_client.post(
+            CREATE_POST_PAGE,
+            data={'text': 'Пост с картинкой', 'image': uploaded},
+        )
+        post = Post.objects.latest('id')
+        self.assertTrue(
+            ThumbnailJob.objects.filter(image=post.image.name).exists()
+        )
+        response = self.guest_client.get(PROFILE_PAGE)
+        self.assertContains(response, 'data-thumbnail-pending')
+        call_command('thumbnail_worker', '--once', '--workers=1',
+                     stdout=StringIO())
+        self.assertFalse(ThumbnailJob.objects.exists())
+        response = self.guest_client.get(PROFILE_PAGE)
+        self.assertNotContains(response, 'data-thumbnail-pending')
+        self.assertContains(response, '<img class="card-img my-2"')
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, ' 960w')
+        self.assertNotContains(response, ' 1440w')
+        self.assertContains(response, 'width="960" height="339"')
+        geometry_string, options = thumbnails.VARIANTS[0][2]
+        default.kvstore.delete(default.backend.thumbnail_file(
+            post.image, geometry_string, **options
+        ))
+        cache.clear()
+        row = Post.objects.feed().get(id=post.id)
+        render_cards([row])
+        self.assertIsNone(cache.get(card_key(row)))
+
+    def test_broken_image_does_not_stall_worker(self):
+        os.makedirs(TEMP_MEDIA_ROOT, exist_ok=True)
+        with open(f'{TEMP_MEDIA_ROOT}/broken.gif', 'wb') as file:
+            file.write(b'not an image')
+        with open(f'{TEMP_MEDIA_ROOT}/good.gif', 'wb') as file:
+            file.write(SMALL_GIF)
+        ThumbnailJob.objects.bulk_create([
+            ThumbnailJob(image='broken.gif'), ThumbnailJob(image='good.gif'),
+        ])
+        call_command('thumbnail_worker', '--once', '--workers=1',
+                     stdout=StringIO(), stderr=StringIO())
+        job = ThumbnailJob.objects.get()
+        self.assertEqual(job.image, 'broken.gif')
+        self.assertEqual(job.attempts, 1)
+        self.assertTrue(job.last_error)
+        self.assertIsNone(job.locked_at)
+        self.assertGreater(job.run_after, timezone.now())
+
+    def test_worker_claims_jobs_once(self):
+        ThumbnailJob.objects.bulk_create(
+            ThumbnailJob(image=f'{index}.gif') for index in range(3)
+        )
+        first = thumbnails.claim('first', 2)
+        second = thumbnails.claim('second', 2)
+        self.assertEqual([job.image for job in first], ['0.gif', '1.gif'])
+        self.assertEqual([job.image for job in second], ['2.gif'])
+        self.assertEqual(thumbnails.claim('third', 2), [])
+
+    def test_image_meta_stored(self):
+        uploaded = SimpleUploadedFile(
+            name='meta.gif',
+            content=SMALL_GIF,
+            content_type='image/gif'
+        )
+        self.authorized_client.post(
+            CREATE_POST_PAGE,
+            data={'text': 'Пост с картинкой', 'image': uploaded},
+        )
+        post = Post.objects.latest('id')
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(SMALL_GIF))
+        self.assertTrue(
+            post.image_placeholder.startswith('data:image/png;base64,')
+        )
+        Post.objects.filter(id=post.id).update(
+            image_width=None, image_height=None, image_size=None,
+            image_placeholder='',
+        )
+        call_command('backfill_images', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertEqual(post.image_size, len(SMALL_GIF))
+
+    def test_image_meta_stored_on_model_save(self):
+        post = Post.objects.create(
+            author=self.user, text='Пост с картинкой',
+            image=SimpleUploadedFile('model.gif', SMALL_GIF, 'image/gif'),
+        )
+        post = Post.objects.get(pk=post.pk)
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        post.image = ''
+        post.save(update_fields=['image'])
+        post = Post.objects.get(pk=post.pk)
+        self.assertIsNone(post.image_width)
+        self.assertEqual(post.image_placeholder, '')
+
+    def test_picture_size_from_stored_meta(self):
+        self.assertEqual(thumbnails.thumbnail_size(2, 1), (960, 339))
+        self.assertEqual(thumbnails.thumbnail_size(None, None), (960, 339))
+        with mock.patch.object(thumbnails, 'POST_THUMBNAIL',
+                               ('960x339', {'crop': 'center'})):
+            self.assertEqual(thumbnails.thumbnail_size(400, 100), (400, 100))
+            self.assertEqual(thumbnails.thumbnail_size(1920, 1080),
+                             (960, 339))
+        Post.objects.filter(id=self.post.id).update(
+            image='missing.gif', image_width=400, image_height=100,
+        )
+        with mock.patch.object(thumbnails, 'POST_THUMBNAIL',
+                               ('960x339', {'crop': 'center'})):
+            response = self.guest_client.get(self.POST_DETAIL_PAGE)
+        self.assertContains(response, 'aspect-ratio: 400 / 100')
+
+    def test_migrate_media(self):
+        os.makedirs(TEMP_MEDIA_ROOT, exist_ok=True)
+        with open(f'{TEMP_MEDIA_ROOT}/legacy.gif', 'wb') as file:
+            file.write(SMALL_GIF)
+        Post.objects.filter(id=self.post.id).update(image='legacy.gif')
+        call_command('migrate_media', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertRegex(self.post.image.name, r'^\w\w/\w\w/\w{64}\.gif$')
+        self.assertEqual(self.post.image.read(), SMALL_GIF)
+        self.assertFalse(os.path.exists(f'{TEMP_MEDIA_ROOT}/legacy.gif'))
+        self.assertTrue(
+            ThumbnailJob.objects.filter(image=self.post.image.name).exists()
+        )
+
+    @override_settings(POST_IMAGE_MAX_SIDE=40)
+    def test_uploaded_image_normalized(self):
+        image = Image.new('RGB', (80, 20))
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        buffer = BytesIO()
+        image.save(buffer, format='JPEG', exif=exif)
+        uploaded = SimpleUploadedFile(
+            name='rotated.jpg',
+            content=buffer.getvalue(),
+            content_type='image/jpeg'
+        )
+        self.authorized_client.post(
+            CREATE_POST_PAGE,
+            data={'text': 'Повёрнутая картинка', 'image': uploaded},
+        )
+        with Image.open(Post.objects.latest('id').image) as saved:
+            self.assertEqual(saved.size, (10, 40))
+            self.assertFalse(saved.getexif())
 
     def test_edit_post(self):
         count_posts = Post.objects.count()
@@ -101,7 +267,7 @@ class PostCreateFormTests(TestCase):
             Post.objects.filter(
                 text='Новый пост',
                 group=self.group,
-                image='posts/small.gif',
+                image__regex=r'^posts/\w\w/\w\w/\w{64}\.gif$',
             ).exists()
         )
 
@@ -1,6 +1,10 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import IntegrityError, transaction
 from django.test import TestCase
 
-from ..models import Group, Post, Comment, Follow, User
+from ..models import Group, Post, Comment, Follow, Stats, User
 
 
 class PostModelTest(TestCase):
@@ -56,6 +60,13 @@ class PostModelTest(TestCase):
         self.assertEqual(follow._meta.get_field('author').verbose_name,
                          'Автор')
 
+    def test_follow_is_unique(self):
+        another_user = User.objects.create_user(username='another_user')
+        Follow.objects.create(user=PostModelTest.user, author=another_user)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=PostModelTest.user,
+                                  author=another_user)
+
     def test_comment(self):
         comment = PostModelTest.comment
         self.assertEqual(comment._meta.get_field('text').verbose_name,
@@ -64,3 +75,62 @@ class PostModelTest(TestCase):
                          'Пост')
         self.assertEqual(comment._meta.get_field('author').verbose_name,
                          'Автор')
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.author, text='Текст')
+
+    def test_write_paths_update_counters(self):
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Коммент')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+        self.assertEqual(Stats.objects.get(user=self.author).posts_count, 1)
+        self.assertEqual(
+            Stats.objects.get(user=self.author).followers_count, 1)
+        self.assertEqual(
+            Stats.objects.get(user=self.reader).following_count, 1)
+        follow.delete()
+        self.post.delete()
+        self.assertEqual(
+            Stats.objects.get(user=self.author).followers_count, 0)
+        self.assertEqual(Stats.objects.get(user=self.author).posts_count, 0)
+
+    def test_author_change_moves_posts_count(self):
+        post = Post.objects.get(id=self.post.id)
+        post.author = self.reader
+        post.save()
+        self.assertEqual(Stats.objects.get(user=self.author).posts_count, 0)
+        self.assertEqual(Stats.objects.get(user=self.reader).posts_count, 1)
+
+    def test_user_without_stats_row_is_counted(self):
+        User.objects.bulk_create([User(username='imported')])
+        imported = User.objects.get(username='imported')
+        Post.objects.create(author=imported, text='Текст')
+        Follow.objects.create(user=self.reader, author=imported)
+        stats = Stats.objects.get(user=imported)
+        self.assertEqual(stats.posts_count, 1)
+        self.assertEqual(stats.followers_count, 1)
+
+    def test_drifted_zero_counters_are_not_decremented(self):
+        comment = Comment.objects.create(post=self.post, author=self.reader,
+                                         text='Коммент')
+        Post.objects.filter(id=self.post.id).update(comments_count=0)
+        Stats.objects.filter(user=self.author).update(posts_count=0)
+        comment.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.post.delete()
+        self.assertEqual(Stats.objects.get(user=self.author).posts_count, 0)
+
+    def test_recount_repairs_drift(self):
+        Stats.objects.filter(user=self.author).update(posts_count=42)
+        Post.objects.filter(id=self.post.id).update(comments_count=7)
+        call_command('recount', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+        self.assertEqual(Stats.objects.get(user=self.author).posts_count, 1)
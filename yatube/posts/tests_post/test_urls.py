@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.test import TestCase, Client
 from http import HTTPStatus
 
@@ -34,6 +35,9 @@ class PostURLTests(TestCase):
         cls.POST_DETAIL_PAGE = f'/posts/{cls.post.id}/'
         cls.POST_EDIT_PAGE = f'/posts/{cls.post.id}/edit/'
 
+    def setUp(self):
+        cache.clear()
+
     def test_unexisting(self):
         response = self.guest_client.get('/unexisting_page/')
         self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
@@ -1,14 +1,30 @@
 import shutil
 import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
 
-from django.test import Client, TestCase, override_settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, override_settings
 from django.urls import reverse
 from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 from django.core.cache import cache
-
-from ..models import Post, Group, Comment, Follow, User
+from django.core.paginator import EmptyPage
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.http import parse_http_date
+
+from ..cards import render_cards
+from ..follows import viewer_follows
+from ..page_cache import cache_page_tagged, index_tags
+from ..paginators import (CursorPaginator, cached_count, capped_count,
+                          estimate_count)
+from ..rows import feed_rows
+from ..models import (PREVIEW_LENGTH, Post, Group, Comment, Follow, Stats,
+                      TimelineEntry, TimelineRefill, User)
 
 
 USER_NAME = 'auth'
@@ -24,6 +40,12 @@ PROFILE_UNFOLLOW = reverse('posts:profile_unfollow',
 PROFILE_FOLLOW = reverse('posts:profile_follow',
                          kwargs={'username': USER_NAME})
 FOLLOW_INDEX = reverse('posts:follow_index')
+# Бюджеты запросов считают запросы страниц, а не общего кэша в БД.
+LOCAL_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
 SMALL_GIF = (
     b'\x47\x49\x46\x38\x39\x61\x02\x00'
     b'\x01\x00\x80\x00\x00\x00\x00\x00'
@@ -34,7 +56,7 @@ SMALL_GIF = (
 )
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, CACHES=LOCAL_CACHES)
 class PostPagesTests(TestCase):
 
     @classmethod
@@ -148,15 +170,113 @@ class PostPagesTests(TestCase):
 
     def test_post_list_cache_index(self):
         response_old = self.client.get(MAIN_PAGE)
+        response_cached = self.client.get(MAIN_PAGE)
+        self.assertIsNone(response_cached.context)
+        self.assertEqual(response_old.content, response_cached.content)
         Post.objects.create(
             author=self.user,
             text='Тестовый текст',
         )
-        response = self.client.get(MAIN_PAGE)
-        self.assertEqual(response_old.content, response.content)
-        cache.clear()
         response_new = self.client.get(MAIN_PAGE)
-        self.assertNotEqual(response.content, response_new.content)
+        self.assertNotEqual(response_old.content, response_new.content)
+
+    def test_page_cache_invalidated_by_writes(self):
+        pages = (GROUP_PAGE, PROFILE_PAGE, self.POST_DETAIL_PAGE)
+        for address in pages:
+            self.client.get(address)
+        Comment.objects.create(author=self.user, text='Новый коммент',
+                               post=self.post)
+        self.assertIsNone(self.client.get(GROUP_PAGE).context)
+        self.assertIn('Новый коммент',
+                      self.client.get(self.POST_DETAIL_PAGE).content.decode())
+        self.group.description = 'Новое описание'
+        self.group.save()
+        self.assertIn('Новое описание',
+                      self.client.get(GROUP_PAGE).content.decode())
+        Follow.objects.create(
+            user=User.objects.create(username='reader'), author=self.user
+        )
+        self.assertIsNotNone(self.client.get(PROFILE_PAGE).context)
+
+    def test_page_cache_invalidated_by_renames(self):
+        reader = User.objects.create(username='reader')
+        Comment.objects.create(author=reader, text='Коммент', post=self.post)
+        pages = (MAIN_PAGE, GROUP_PAGE, PROFILE_PAGE,
+                 self.POST_DETAIL_PAGE)
+        for address in pages:
+            self.client.get(address)
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Лев'
+        author.save()
+        reader.username = 'critic'
+        reader.save()
+        for address in pages:
+            with self.subTest(address=address):
+                self.assertIn('Лев',
+                              self.client.get(address).content.decode())
+        self.assertIn('critic', self.client.get(
+            self.POST_DETAIL_PAGE).content.decode())
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        for address in (MAIN_PAGE, PROFILE_PAGE):
+            with self.subTest(address=address):
+                self.assertIn(
+                    reverse('posts:group_list', kwargs={'slug': 'renamed'}),
+                    self.client.get(address).content.decode(),
+                )
+
+    def test_conditional_get(self):
+        for address in (GROUP_PAGE, PROFILE_PAGE, self.POST_DETAIL_PAGE):
+            with self.subTest(address=address):
+                response = self.client.get(address)
+                etag = response['ETag']
+                self.assertIn('Last-Modified', response)
+                response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                Comment.objects.create(author=self.user, text='Коммент',
+                                       post=self.post)
+                Post.objects.create(author=self.user, text='Новый',
+                                    group=self.group)
+                response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_conditional_get_after_deletes_and_follows(self):
+        comment = Comment.objects.create(author=self.user, text='Коммент',
+                                         post=self.post)
+        reader = User.objects.create(username='reader')
+        for address, write in (
+            (self.POST_DETAIL_PAGE, comment.delete),
+            (PROFILE_PAGE, lambda: Follow.objects.filter(
+                user=reader).delete()),
+        ):
+            with self.subTest(address=address):
+                Follow.objects.get_or_create(user=reader, author=self.user)
+                response = self.client.get(address)
+                etag = response['ETag']
+                modified = parse_http_date(response['Last-Modified'])
+                write()
+                response = self.client.get(address, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertGreaterEqual(
+                    parse_http_date(response['Last-Modified']), modified
+                )
+
+    def test_conditional_get_skips_last_modified_for_users(self):
+        response = self.authorized_client.get(PROFILE_PAGE)
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        self.assertNotEqual(response['ETag'],
+                            self.client.get(PROFILE_PAGE)['ETag'])
+
+    def test_group_version_without_aggregates(self):
+        response = self.client.get(GROUP_PAGE)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(GROUP_PAGE,
+                                       HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT', queries[0]['sql'].upper())
 
     def test_user_follow(self):
         new_user = User.objects.create(
@@ -184,7 +304,97 @@ class PostPagesTests(TestCase):
         self.assertNotIn(self.post,
                          follow_index_response2.context['page_obj'])
 
+    def test_follow_and_unfollow_are_idempotent(self):
+        reader = User.objects.create(username='reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        for _ in range(2):
+            reader_client.get(PROFILE_FOLLOW)
+        self.assertEqual(
+            Follow.objects.filter(user=reader, author=self.user).count(), 1
+        )
+        self.assertEqual(Stats.objects.get(user=self.user).followers_count, 1)
+        self.assertEqual(Stats.objects.get(user=reader).following_count, 1)
+        for _ in range(2):
+            response = reader_client.get(PROFILE_UNFOLLOW)
+            self.assertRedirects(response, PROFILE_PAGE)
+        self.assertFalse(Follow.objects.filter(user=reader).exists())
+        self.assertEqual(Stats.objects.get(user=self.user).followers_count, 0)
+        self.assertFalse(TimelineEntry.objects.filter(user=reader).exists())
+
+    def test_viewer_follows_loads_authors_in_one_query(self):
+        reader = User.objects.create(username='reader')
+        authors = [self.user] + [
+            User.objects.create(username=f'author_{index}')
+            for index in range(3)
+        ]
+        Follow.objects.create(user=reader, author=authors[0])
+        Follow.objects.create(user=reader, author=authors[2])
+        request = RequestFactory().get(PROFILE_PAGE)
+        request.user = reader
+        with self.assertNumQueries(1):
+            follows = viewer_follows(request).load(authors)
+        with self.assertNumQueries(0):
+            self.assertEqual([author in viewer_follows(request)
+                              for author in authors],
+                             [True, False, True, False])
+        reader_client = Client()
+        reader_client.force_login(reader)
+        self.assertIn('Отписаться',
+                      reader_client.get(PROFILE_PAGE).content.decode())
+        self.assertIs(follows, viewer_follows(request))
+
+    def test_follow_index_timeline(self):
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=reader, post=self.post).exists()
+        )
+        new_post = Post.objects.create(author=self.user, text='Новый пост')
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=reader, post=new_post).exists()
+        )
+        reader_client = Client()
+        reader_client.force_login(reader)
+        response = reader_client.get(FOLLOW_INDEX)
+        self.assertEqual(list(response.context['page_obj']),
+                         [new_post, self.post])
+        TimelineEntry.objects.all().delete()
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(TimelineEntry.objects.filter(user=reader).count(), 2)
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=0)
+    def test_follow_index_fanout_on_read(self):
+        reader = User.objects.create(username='reader')
+        Follow.objects.create(user=reader, author=self.user)
+        new_post = Post.objects.create(author=self.user, text='Новый пост')
+        self.assertFalse(TimelineEntry.objects.filter(user=reader).exists())
+        reader_client = Client()
+        reader_client.force_login(reader)
+        response = reader_client.get(FOLLOW_INDEX)
+        self.assertEqual(list(response.context['page_obj']),
+                         [new_post, self.post])
+
+    @override_settings(TIMELINE_FANOUT_MAX_POSTS=1)
+    def test_follow_index_after_author_drops_under_thresholds(self):
+        reader = User.objects.create(username='reader')
+        new_post = Post.objects.create(author=self.user, text='Новый пост')
+        Follow.objects.create(user=reader, author=self.user)
+        self.assertFalse(TimelineEntry.objects.filter(user=reader).exists())
+        new_post.delete()
+        self.assertFalse(TimelineEntry.objects.filter(user=reader).exists())
+        reader_client = Client()
+        reader_client.force_login(reader)
+        response = reader_client.get(FOLLOW_INDEX)
+        self.assertEqual(list(response.context['page_obj']), [self.post])
+        call_command('rebuild_timelines', pending=True, stdout=StringIO())
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=reader, post=self.post).exists()
+        )
+        self.assertFalse(TimelineRefill.objects.exists())
 
+
+@override_settings(CACHES=LOCAL_CACHES)
 class PaginatorViewsTest(TestCase):
     FIRST_PAGE_COUNT = 10
     TOTAL_COUNT = 13
@@ -242,3 +452,436 @@ class PaginatorViewsTest(TestCase):
                 for obj in response.context['page_obj']:
                     with self.subTest(value=str(obj)):
                         self.assertEqual(obj.author, self.user)
+
+    def test_cursor_pages_index(self):
+        first_page = self.client.get(MAIN_PAGE).context['page_obj']
+        paginator = first_page.paginator
+        response = self.client.get(
+            MAIN_PAGE, {'after': paginator.next_cursor(first_page)}
+        )
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page),
+                         self.TOTAL_COUNT - self.FIRST_PAGE_COUNT)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        cache.clear()
+        response = self.client.get(
+            MAIN_PAGE, {'before': paginator.previous_cursor(second_page)}
+        )
+        self.assertEqual(list(response.context['page_obj']),
+                         list(first_page))
+
+    def test_cursor_page_numbers(self):
+        first_page = self.client.get(MAIN_PAGE).context['page_obj']
+        paginator = first_page.paginator
+        with self.assertNumQueries(0):
+            self.assertEqual(first_page.next_page_number(), 2)
+        second_page = paginator.cursor_page(
+            after=paginator.next_cursor(first_page)
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(second_page.number, 2)
+            self.assertEqual(second_page.previous_page_number(), 1)
+            self.assertEqual(second_page.start_index(),
+                             self.FIRST_PAGE_COUNT + 1)
+            self.assertEqual(second_page.end_index(), self.TOTAL_COUNT)
+        with self.assertRaises(EmptyPage):
+            second_page.next_page_number()
+        back = paginator.cursor_page(
+            before=paginator.previous_cursor(second_page)
+        )
+        self.assertEqual(back.number, 1)
+        self.assertEqual(back.start_index(), 1)
+
+    def test_cursor_links_keep_query(self):
+        response = self.client.get(MAIN_PAGE, {'page': 1, 'ref': 'mail'})
+        page = response.context['page_obj']
+        cursor = page.paginator.next_cursor(page)
+        self.assertContains(response, f'?ref=mail&amp;after={cursor}')
+        response = self.client.get(MAIN_PAGE, {'after': cursor,
+                                               'ref': 'mail'})
+        self.assertContains(response, '?ref=mail&amp;page=1')
+
+    def test_cached_count_follows_writes(self):
+        counter = cached_count('index')
+        self.assertEqual(counter(Post.objects.all()), self.TOTAL_COUNT)
+        post = Post.objects.create(author=self.user, text='Новый пост',
+                                   group=self.group)
+        group_counter = cached_count(f'group:{self.group.pk}')
+        self.assertEqual(group_counter(Post.objects.all()),
+                         self.TOTAL_COUNT + 1)
+        post.group = None
+        post.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(counter(Post.objects.all()),
+                             self.TOTAL_COUNT + 1)
+            self.assertEqual(group_counter(Post.objects.all()),
+                             self.TOTAL_COUNT)
+        post.delete()
+        self.assertEqual(counter(Post.objects.all()), self.TOTAL_COUNT)
+
+    def test_capped_count_and_page_window(self):
+        paginator = CursorPaginator(Post.objects.all(), 1,
+                                    counter=capped_count(5))
+        self.assertEqual(str(paginator.count), '5+')
+        self.assertEqual(paginator.page_window(paginator.page(3)),
+                         [1, 2, 3, 4, 5, None])
+        self.assertTrue(paginator.has_more(paginator.page(5)))
+        paginator = CursorPaginator(Post.objects.all(), 1)
+        self.assertEqual(paginator.page_window(paginator.page(7)),
+                         [1, None, 5, 6, 7, 8, 9, None, self.TOTAL_COUNT])
+        self.assertFalse(paginator.has_more(paginator.page(13)))
+
+    def test_cursor_invalid_token(self):
+        response = self.client.get(GROUP_PAGE, {'after': 'не курсор'})
+        self.assertEqual(len(response.context['page_obj']),
+                         self.FIRST_PAGE_COUNT)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class FeedQueriesTest(TestCase):
+    """Число запросов на страницах лент не зависит от числа постов."""
+    QUERY_BUDGETS = {
+        MAIN_PAGE: 4,
+        GROUP_PAGE: 6,
+        reverse('posts:profile', kwargs={'username': 'author_0'}): 7,
+        FOLLOW_INDEX: 5,
+    }
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug=GROUP_SLUG,
+            description='Тестовое описание',
+        )
+        for i in range(PaginatorViewsTest.FIRST_PAGE_COUNT):
+            author = User.objects.create_user(username=f'author_{i}')
+            Follow.objects.create(user=cls.reader, author=author)
+            Post.objects.create(author=author, text='Тестовый текст',
+                                group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_list_pages_query_budget(self):
+        for address, budget in self.QUERY_BUDGETS.items():
+            with self.subTest(address=address):
+                with self.assertNumQueries(budget):
+                    self.reader_client.get(address)
+
+    @skipUnless(connection.vendor == 'sqlite',
+                'EXPLAIN QUERY PLAN есть только в SQLite')
+    def test_list_pages_use_ordered_index(self):
+        post = Post.objects.first()
+        scans = {
+            MAIN_PAGE: ('posts', 'posts_pub_date'),
+            GROUP_PAGE: ('posts', 'posts_group_feed_idx'),
+            reverse('posts:profile', kwargs={'username': 'author_0'}): (
+                'posts', 'posts_author_feed_idx'),
+            reverse('posts:comments', kwargs={'post_id': post.id}): (
+                'comments', 'comments_post_feed_idx'),
+        }
+        for address, (table, index) in scans.items():
+            with self.subTest(address=address):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(address)
+                sql = next(
+                    query['sql'] for query in queries
+                    if f'FROM "{table}"' in query['sql']
+                    and 'ORDER BY' in query['sql']
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                    plan = ' '.join(row[-1] for row in cursor.fetchall())
+                self.assertIn(f'USING INDEX {index}', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_feed_rows_match_posts(self):
+        posts = list(Post.objects.feed().order_by('-pub_date', '-id'))
+        rows = list(feed_rows(Post.objects.order_by('-pub_date', '-id')))
+        self.assertEqual(rows, posts)
+        for row, post in zip(rows, posts):
+            with self.subTest(post=post.pk):
+                self.assertEqual(row.author, post.author)
+                self.assertEqual(row.author.username, post.author.username)
+                self.assertEqual(row.group.slug, post.group.slug)
+                self.assertEqual(row.image, post.image)
+                self.assertFalse(hasattr(row, '__dict__'))
+        self.assertEqual(render_cards(rows), render_cards(posts))
+        with CaptureQueriesContext(connection) as queries:
+            feed_rows(Post.objects.all()).count()
+        self.assertNotIn('JOIN', queries[0]['sql'].upper())
+        out = StringIO()
+        call_command('bench_feed', pages=1, stdout=out)
+        self.assertIn('PostRow', out.getvalue())
+
+    def test_feeds_show_preview_without_body(self):
+        text = 'Очень длинный текст. ' * 100
+        post = Post.objects.create(author=self.reader, text=text)
+        self.assertEqual(len(post.preview), PREVIEW_LENGTH)
+        for address in (MAIN_PAGE, reverse('posts:profile',
+                                           kwargs={'username': 'reader'})):
+            with self.subTest(address=address):
+                with CaptureQueriesContext(connection) as queries:
+                    content = self.client.get(address).content.decode()
+                self.assertIn(post.preview, content)
+                self.assertNotIn(text, content)
+                self.assertFalse(any('"posts"."text"' in query['sql']
+                                     for query in queries))
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.id})
+        )
+        self.assertIn(text, response.content.decode())
+
+    def test_post_cards_rendered_once(self):
+        posts = list(Post.objects.feed())
+        cards = render_cards(posts)
+        with mock.patch('posts.cards.render_to_string') as render:
+            self.assertEqual(render_cards(posts), cards)
+        render.assert_not_called()
+
+    def test_thumbnails_looked_up_in_one_query(self):
+        for post in Post.objects.all():
+            Post.objects.filter(id=post.id).update(
+                image=f'posts/{post.id}.gif'
+            )
+        posts = list(Post.objects.feed())
+        with self.assertNumQueries(2):
+            render_cards(posts)
+        with self.assertNumQueries(0):
+            render_cards(posts)
+
+
+@override_settings(PAGE_CACHE_STALE_GRACE=60, PAGE_CACHE_EARLY_EXPIRY=0)
+class StalePageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER_NAME)
+        cls.post = Post.objects.create(author=cls.user, text='Старый текст')
+
+    def setUp(self):
+        cache.clear()
+
+    def assertServedWhileLocked(self, text):
+        with mock.patch('posts.page_cache.cache.add', return_value=False):
+            response = self.client.get(MAIN_PAGE)
+        self.assertIsNone(response.context)
+        self.assertIn(text, response.content.decode())
+
+    def test_stale_page_served_after_write(self):
+        self.client.get(MAIN_PAGE)
+        post = Post.objects.get(id=self.post.id)
+        post.text = 'Новый текст'
+        post.save()
+        Post.objects.create(author=self.user, text='Ещё пост')
+        self.assertServedWhileLocked('Старый текст')
+        response = self.client.get(MAIN_PAGE)
+        self.assertIn('Новый текст', response.content.decode())
+        self.assertIn('Ещё пост', response.content.decode())
+
+    @override_settings(PAGE_CACHE_TIMEOUT=0)
+    def test_stale_page_served_after_expiry(self):
+        self.client.get(MAIN_PAGE)
+        self.assertServedWhileLocked('Старый текст')
+
+    def test_waiters_skip_uncacheable_page(self):
+        calls = []
+
+        @cache_page_tagged(index_tags)
+        def view(request):
+            calls.append(request)
+            response = HttpResponse('ok')
+            response.set_cookie('seen', '1')
+            return response
+
+        request = RequestFactory().get('/uncacheable/')
+        request.user = AnonymousUser()
+        view(request)
+        with mock.patch('posts.page_cache.cache.add', return_value=False), \
+                mock.patch('posts.page_cache.time.sleep') as sleep:
+            view(request)
+        sleep.assert_not_called()
+        self.assertEqual(len(calls), 2)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER_NAME)
+        cls.other = User.objects.create_user(username='other')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug=GROUP_SLUG,
+            description='Тестовое описание',
+        )
+        cls.cats = Post.objects.create(
+            author=cls.user, group=cls.group,
+            text='Котики котики котики и собаки',
+        )
+        cls.dogs = Post.objects.create(
+            author=cls.other, text='Собаки и один котик',
+        )
+        Post.objects.create(author=cls.user, text='Про погоду')
+
+    def search(self, **params):
+        response = self.client.get(reverse('posts:search'), params)
+        return list(response.context['page_obj'])
+
+    def test_ranked_prefix_search(self):
+        self.assertEqual(self.search(q='котик'), [self.cats, self.dogs])
+        self.assertEqual(self.search(q='СОБАКИ один'), [self.dogs])
+        self.assertEqual(self.search(q='" OR * NEAR('), [])
+
+    def test_search_filters(self):
+        self.assertEqual(self.search(q='котик', group=GROUP_SLUG),
+                         [self.cats])
+        self.assertEqual(self.search(q='котик', author='other'),
+                         [self.dogs])
+
+    def test_index_follows_writes(self):
+        dogs = Post.objects.get(id=self.dogs.id)
+        dogs.text = 'Только собаки'
+        dogs.save()
+        self.assertEqual(self.search(q='котик'), [self.cats])
+        Post.objects.get(id=self.cats.id).delete()
+        self.assertEqual(self.search(q='котик'), [])
+        call_command('rebuild_search', '--optimize', stdout=StringIO())
+        self.assertEqual(self.search(q='собаки'), [self.dogs])
+
+    def test_admin_search(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get('/admin/posts/post/', {'q': 'погод'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+
+class AdminChangelistTest(TestCase):
+    CHANGELISTS = (
+        '/admin/posts/post/', '/admin/posts/comment/', '/admin/posts/follow/',
+    )
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        cls.group = Group.objects.create(
+            title='Тестовый заголовок',
+            slug=GROUP_SLUG,
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        start = User.objects.count()
+        for i in range(start, start + count):
+            author = User.objects.create_user(username=f'author_{i}')
+            post = Post.objects.create(author=author, text='Текст',
+                                       group=self.group)
+            Comment.objects.create(post=post, author=author, text='Текст')
+            Follow.objects.create(user=self.admin, author=author)
+
+    def changelist_queries(self, address):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(address)
+        self.assertEqual(response.status_code, 200)
+        return len(context), response
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.add_rows(2)
+        queries = {
+            address: self.changelist_queries(address)[0]
+            for address in self.CHANGELISTS
+        }
+        self.add_rows(5)
+        for address in self.CHANGELISTS:
+            with self.subTest(address=address):
+                self.assertEqual(self.changelist_queries(address)[0],
+                                 queries[address])
+
+    def test_estimated_count(self):
+        self.add_rows(3)
+        Post.objects.filter(id=Post.objects.earliest('id').id).delete()
+        count, response = self.changelist_queries('/admin/posts/post/')
+        self.assertEqual(response.context['cl'].result_count,
+                         Post.objects.count())
+        with override_settings(FEED_COUNT_CAP=1):
+            response = self.client.get('/admin/posts/post/')
+        self.assertEqual(str(response.context['cl'].result_count), '1+')
+        self.assertNotContains(response, '<select name="form-0-group"')
+        self.assertContains(response, 'name="form-0-group"')
+        response = self.client.get('/admin/posts/post/',
+                                   {'author__id__exact': self.admin.id})
+        self.assertEqual(response.context['cl'].result_count, 0)
+
+    @skipUnless(connection.vendor == 'sqlite', 'sqlite_stat1 есть в SQLite')
+    def test_estimated_count_from_statistics(self):
+        self.add_rows(3)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        self.assertEqual(estimate_count(Post), Post.objects.count())
+
+
+@override_settings(COMMENTS_PER_PAGE=3, CACHES=LOCAL_CACHES)
+class CommentsPageTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        super().setUpClass()
+        cls.user = User.objects.create_user(username=USER_NAME)
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый текст')
+        for i in range(5):
+            author = User.objects.create_user(username=f'commenter_{i}')
+            Comment.objects.create(post=cls.post, author=author,
+                                   text=f'Комментарий {i}')
+        cls.POST_DETAIL_PAGE = reverse('posts:post_detail',
+                                       kwargs={'post_id': cls.post.id})
+        cls.COMMENTS = reverse('posts:comments',
+                               kwargs={'post_id': cls.post.id})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_first_comments_on_detail_page(self):
+        response = self.client.get(self.POST_DETAIL_PAGE)
+        comments = response.context['comments']
+        self.assertEqual([comment.text for comment in comments],
+                         ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'])
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, 'data-more-comments')
+
+    def test_post_detail_query_budget(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(self.POST_DETAIL_PAGE)
+        self.assertEqual(response.context['author'], self.user)
+        self.assertContains(response, 'Комментарий 2')
+
+    def test_next_comments_partial(self):
+        first = self.client.get(self.COMMENTS).context['comments']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.COMMENTS, {
+                'after': first.paginator.next_cursor(first),
+            })
+        comments = response.context['comments']
+        self.assertEqual([comment.text for comment in comments],
+                         ['Комментарий 3', 'Комментарий 4'])
+        self.assertFalse(comments.has_next())
+        self.assertNotContains(response, 'data-more-comments')
+        self.assertNotContains(response, '<html')
+
+    def test_bad_cursor_rejected(self):
+        first = self.client.get(self.COMMENTS).context['comments']
+        cursor = first.paginator.next_cursor(first)
+        for after in ('garbage', cursor[:-3], 'MjAyMHwx'):
+            with self.subTest(after=after):
+                with self.assertNumQueries(0):
+                    response = self.client.get(self.COMMENTS,
+                                               {'after': after})
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,268 @@
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from PIL import Image, features
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.base import ThumbnailBackend as BaseThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.helpers import serialize, tokey
+from sorl.thumbnail.engines import pil_engine
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import page_cache
+from .models import Group, Post, ThumbnailJob
+
+# Миниатюра поста и её варианты в современных форматах для srcset.
+POST_THUMBNAIL = ('960x339', {'crop': 'center', 'upscale': True})
+POST_RATIO = 339 / 960
+MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp'}
+FORMATS = tuple(
+    format_ for format_ in MIME_TYPES if features.check(format_.lower())
+)
+VARIANTS = tuple(
+    (format_, width, (f'{width}x{round(width * POST_RATIO)}',
+                      {'crop': 'center', 'format': format_}))
+    for format_ in FORMATS for width in settings.POST_IMAGE_WIDTHS
+)
+JOB_GUARD_KEY = 'thumbnail-job:{}'
+
+Picture = namedtuple('Picture', 'img sources complete')
+Source = namedtuple('Source', 'type srcset')
+
+
+class Engine(pil_engine.Engine):
+    """PIL-движок sorl для Pillow без Image.ANTIALIAS."""
+
+    def _scale(self, image, width, height):
+        return image.resize((width, height), resample=Image.LANCZOS)
+
+
+class ThumbnailBackend(BaseThumbnailBackend):
+    """Бэкенд sorl, который умеет не строить миниатюру в запросе."""
+
+    def resolve_options(self, source, options):
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        return options
+
+    def _get_thumbnail_filename(self, source, geometry_string, options):
+        key = tokey(source.key, geometry_string, serialize(options))
+        extension = EXTENSIONS.get(options['format'],
+                                   options['format'].lower())
+        return (f'{sorl_settings.THUMBNAIL_PREFIX}'
+                f'{key[:2]}/{key[2:4]}/{key}.{extension}')
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры, которую построил бы get_thumbnail."""
+        source = ImageFile(file_)
+        options = self.resolve_options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+
+class KVStore(cached_db_kvstore.KVStore):
+    """Хранилище метаданных sorl с пакетным чтением.
+
+    Пишет только воркер миниатюр, поэтому запись в БД не задерживает
+    ответы; запросы читают из кэша и идут в БД одним запросом на промахи.
+    """
+
+    def get_many(self, image_files):
+        keys = [add_prefix(image_file.key) for image_file in image_files]
+        values = self.cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(key__in=missing)
+                          .values_list('key', 'value'))
+            fetched = {
+                key: stored.get(key, cached_db_kvstore.EMPTY_VALUE)
+                for key in missing
+            }
+            self.cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(fetched)
+        return [
+            None if values[key] == cached_db_kvstore.EMPTY_VALUE
+            else deserialize_image_file(values[key])
+            for key in keys
+        ]
+
+
+def source_variants(width, height):
+    """Варианты srcset, для которых не нужно растягивать исходник.
+
+    Пока размер картинки не известен, годятся все.
+    """
+    if not width or not height:
+        return VARIANTS
+    return tuple(
+        (format_, variant_width, geometry)
+        for format_, variant_width, geometry in VARIANTS
+        if variant_width <= width
+        and round(variant_width * POST_RATIO) <= height
+    )
+
+
+def geometries(variants):
+    return (POST_THUMBNAIL,) + tuple(
+        geometry for format_, width, geometry in variants
+    )
+
+
+def ready_pictures(images):
+    """Готовые миниатюры картинок с вариантами (или None).
+
+    Все геометрии всех картинок читаются из хранилища одним get_many.
+    Размер исходника берётся из сохранённых image_width/image_height.
+    complete у Picture ложно, пока воркер построил не все варианты.
+    """
+    images = [
+        (image, source_variants(getattr(image.instance, 'image_width', None),
+                                getattr(image.instance, 'image_height', None)))
+        for image in images if image
+    ]
+    found = iter(default.kvstore.get_many([
+        default.backend.thumbnail_file(image, geometry_string, **options)
+        for image, variants in images
+        for geometry_string, options in geometries(variants)
+    ]))
+    pictures = {}
+    for image, variants in images:
+        img, *thumbnails = (next(found) for geometry in geometries(variants))
+        srcsets = {}
+        for (format_, width, geometry), thumbnail in zip(variants,
+                                                         thumbnails):
+            if thumbnail is not None:
+                srcsets.setdefault(format_, []).append(
+                    f'{thumbnail.url} {width}w'
+                )
+        pictures[image.name] = img and Picture(img, [
+            Source(MIME_TYPES[format_], ', '.join(srcset))
+            for format_, srcset in srcsets.items()
+        ], None not in thumbnails)
+    return pictures
+
+
+def thumbnail_size(width, height):
+    """Ширина и высота миниатюры POST_THUMBNAIL по сохранённому размеру
+    картинки — так же, как кадрирует sorl, но без чтения файлов."""
+    box_width, box_height = map(int, POST_THUMBNAIL[0].split('x'))
+    if not width or not height:
+        return box_width, box_height
+    factor = max(box_width / width, box_height / height)
+    if factor > 1 and not POST_THUMBNAIL[1].get('upscale'):
+        factor = 1
+    return (min(round(width * factor), box_width),
+            min(round(height * factor), box_height))
+
+
+def ready_picture(image):
+    return ready_pictures([image]).get(getattr(image, 'name', ''))
+
+
+def enqueue(*names):
+    """Ставит картинки в очередь воркера миниатюр (каждую один раз)."""
+    names = [
+        name for name in names
+        if name and cache.add(JOB_GUARD_KEY.format(name), True,
+                              settings.THUMBNAIL_JOB_GUARD_TIMEOUT)
+    ]
+    if names:
+        ThumbnailJob.objects.bulk_create(
+            [ThumbnailJob(image=name) for name in names],
+            ignore_conflicts=True,
+        )
+
+
+def claim(worker, limit):
+    """Забирает для воркера до limit готовых к работе задач.
+
+    Задачу метит условный UPDATE: если её успел взять другой воркер,
+    она не попадёт в выборку. Замок старше THUMBNAIL_JOB_LOCK_TIMEOUT
+    считается брошенным.
+    """
+    now = timezone.now()
+    free = (
+        Q(locked_at__isnull=True)
+        | Q(locked_at__lt=now - timedelta(
+            seconds=settings.THUMBNAIL_JOB_LOCK_TIMEOUT
+        ))
+    )
+    ready = ThumbnailJob.objects.filter(
+        free, run_after__lte=now,
+        attempts__lt=settings.THUMBNAIL_JOB_MAX_ATTEMPTS,
+    )
+    ids = list(ready.order_by('id').values_list('id', flat=True)[:limit])
+    ready.filter(id__in=ids).update(locked_at=now, worker=worker)
+    return list(ThumbnailJob.objects.filter(
+        id__in=ids, locked_at=now, worker=worker,
+    ).order_by('id'))
+
+
+def generate(name):
+    """Строит все миниатюры картинки; выполняется воркером.
+
+    sorl глотает ошибку чтения исходника и не сохраняет миниатюру,
+    поэтому её отсутствие в хранилище считается ошибкой.
+    """
+    source = ImageFile(name, default_storage)
+    size = Post.objects.filter(image=name).values_list(
+        'image_width', 'image_height'
+    ).first() or (None, None)
+    for geometry_string, options in geometries(source_variants(*size)):
+        thumbnail = default.backend.get_thumbnail(
+            source, geometry_string, **options
+        )
+        if not default.kvstore.get(thumbnail):
+            raise IOError(f'Миниатюра {geometry_string} для {name} '
+                          f'не построена')
+
+
+def fail(job, error):
+    """Откладывает задачу после ошибки: каждый раз вдвое дольше.
+
+    После THUMBNAIL_JOB_MAX_ATTEMPTS попыток задача остаётся в очереди
+    с последней ошибкой и больше не берётся.
+    """
+    delay = settings.THUMBNAIL_JOB_RETRY_DELAY * 2 ** job.attempts
+    ThumbnailJob.objects.filter(pk=job.pk).update(
+        attempts=job.attempts + 1, last_error=error,
+        run_after=timezone.now() + timedelta(seconds=delay),
+        locked_at=None, worker='',
+    )
+
+
+def finish(names):
+    """Убирает задачи и сбрасывает страницы с этими картинками."""
+    with transaction.atomic():
+        ThumbnailJob.objects.filter(image__in=names).delete()
+        posts = Post.objects.filter(image__in=names).values_list(
+            'id', 'author_id', 'group_id'
+        )
+        tags = {'index'}
+        group_ids = set()
+        for post_id, author_id, group_id in posts:
+            tags.update((f'post:{post_id}', f'author:{author_id}'))
+            group_ids.add(group_id)
+        slugs = Group.objects.filter(pk__in=group_ids).values_list(
+            'slug', flat=True
+        )
+        tags.update(f'group:{slug}' for slug in slugs)
+    page_cache.invalidate(*tags)
+    cache.delete_many([JOB_GUARD_KEY.format(name) for name in names])
@@ -0,0 +1,150 @@
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import (FEED_FIELDS, Follow, Post, Stats, TimelineEntry,
+                     TimelineRefill)
+from .paginators import capped_count
+from .rows import feed_rows
+from .utils import paginate
+
+
+def fanout_on_read(author):
+    """Подмешивать ли посты автора в ленты при чтении, а не при записи."""
+    return Stats.objects.filter(
+        Q(followers_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS)
+        | Q(posts_count__gt=settings.TIMELINE_FANOUT_MAX_POSTS),
+        user_id=author.id,
+    ).exists()
+
+
+def bulk_insert(entries, batch_size=None):
+    entries = iter(entries)
+    batch_size = batch_size or settings.TIMELINE_BATCH_SIZE
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out(post):
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if fanout_on_read(post.author):
+        return
+    followers = (Follow.objects.filter(author_id=post.author_id)
+                 .values_list('user_id', flat=True).iterator())
+    bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post.id,
+                      author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in followers
+    )
+
+
+def reassign(post):
+    """Переносит пост из лент подписчиков прежнего автора к новому."""
+    TimelineEntry.objects.filter(post_id=post.id).delete()
+    fan_out(post)
+
+
+def backfill(user_id, author):
+    """Переносит посты автора в ленту нового подписчика."""
+    if fanout_on_read(author):
+        return
+    posts = author.posts.values_list('id', 'pub_date').iterator()
+    bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id,
+                      author_id=author.id, pub_date=pub_date)
+        for post_id, pub_date in posts
+    )
+
+
+def refill(author_id, batch_size=None):
+    """Раскладывает все посты автора по лентам всех его подписчиков."""
+    followers = list(Follow.objects.filter(author_id=author_id)
+                     .values_list('user_id', flat=True))
+    posts = (Post.objects.filter(author_id=author_id)
+             .values_list('id', 'pub_date').iterator())
+    bulk_insert(
+        (TimelineEntry(user_id=user_id, post_id=post_id,
+                       author_id=author_id, pub_date=pub_date)
+         for post_id, pub_date in posts
+         for user_id in followers),
+        batch_size,
+    )
+
+
+def shrunk(author_id, field):
+    """Проверяет автора после уменьшения счётчика field.
+
+    Пока автор был выше порогов, его новые посты и новые подписчики
+    в timelines не попадали. Если счётчик только что опустился до порога,
+    а второй порог не превышен, автор ставится в очередь дозаполнения:
+    её разбирает manage.py rebuild_timelines --pending, а до тех пор
+    посты автора подмешиваются при чтении.
+    """
+    limits = {
+        'followers_count': settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+        'posts_count': settings.TIMELINE_FANOUT_MAX_POSTS,
+    }
+    if field not in limits:
+        return
+    crossed = Stats.objects.filter(user_id=author_id, **{
+        name if name == field else f'{name}__lte': limit
+        for name, limit in limits.items()
+    })
+    if crossed.exists():
+        TimelineRefill.objects.bulk_create(
+            [TimelineRefill(author_id=author_id)], ignore_conflicts=True,
+        )
+
+
+def refill_pending(batch_size=None):
+    """Дозаполняет ленты авторов из очереди; возвращает их число."""
+    done = 0
+    for author_id in list(TimelineRefill.objects.order_by('created')
+                          .values_list('author_id', flat=True)):
+        refill(author_id, batch_size)
+        TimelineRefill.objects.filter(author_id=author_id).delete()
+        done += 1
+    return done
+
+
+def trim(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def read_authors(user):
+    """Авторы из подписок пользователя, чьи посты читаются напрямую."""
+    followers = settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    posts = settings.TIMELINE_FANOUT_MAX_POSTS
+    return Follow.objects.filter(
+        Q(author__stats__followers_count__gt=followers)
+        | Q(author__stats__posts_count__gt=posts)
+        | Q(author__timeline_refill__isnull=False),
+        user=user,
+    ).values_list('author_id', flat=True)
+
+
+def follow_page(request, user):
+    """Страница ленты подписок: диапазонное чтение из timelines."""
+    entries = TimelineEntry.objects.filter(user=user)
+    authors = list(read_authors(user))
+    if authors:
+        posts_list = feed_rows(Post.objects.filter(
+            Q(id__in=entries.values('post_id')) | Q(author_id__in=authors)
+        ))
+        return paginate(request, posts_list, counter=capped_count())
+    return paginate(
+        request,
+        entries.select_related('post__author', 'post__group').only(
+            'pub_date', 'post', *(f'post__{field}' for field in FEED_FIELDS)
+        ),
+        ordering=('-pub_date', '-post_id'),
+        key=attrgetter('pub_date', 'id'),
+        transform=lambda rows: [entry.post for entry in rows],
+        counter=capped_count(),
+    )
@@ -0,0 +1,19 @@
+from .paginators import CursorPaginator, InvalidCursor
+
+N_POSTS_IN_PAGE = 10
+
+
+def paginate(request, queryset, per_page=N_POSTS_IN_PAGE, **kwargs):
+    """Страница ленты: по курсору, если он передан, иначе по номеру.
+
+    Неразборчивый курсор, как и неверный номер, ведёт на первую страницу.
+    """
+    paginator = CursorPaginator(queryset, per_page, **kwargs)
+    after = request.GET.get('after')
+    before = request.GET.get('before')
+    if after or before:
+        try:
+            return paginator.cursor_page(after=after, before=before)
+        except InvalidCursor:
+            pass
+    return paginator.get_page(request.GET.get('page'))
@@ -1,26 +1,33 @@
+from django.core.paginator import Paginator
+from django.http import HttpResponseBadRequest
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
-from django.core.paginator import Paginator
 from django.contrib.auth.decorators import login_required
-from django.views.decorators.cache import cache_page
 
-from .models import Group, Post, Follow
+from .models import Group, Post
+from .conditional import (conditional_page, group_version, post_version,
+                          profile_version)
 from .forms import PostForm, CommentForm
+from .loaders import comments_page, load_post_detail
+from . import follows, thumbnails
+from .rows import feed_rows
+from .search import search
+from .paginators import InvalidCursor, cached_count
+from .page_cache import (cache_page_tagged, comments_tags, group_tags,
+                         index_tags, post_tags, profile_tags)
+from .timelines import follow_page
+from .utils import N_POSTS_IN_PAGE, paginate
 
 User = get_user_model()
 
-N_POSTS_IN_PAGE = 10
-CACHE_TIME = 20
-
 
-@cache_page(CACHE_TIME, key_prefix='index_page')
+@cache_page_tagged(index_tags, stale=True)
 def index(request):
     template = 'posts/index.html'
-    posts_list = Post.objects.all()
-    paginator = Paginator(posts_list, N_POSTS_IN_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts_list = feed_rows(Post.objects.all())
+    page_obj = paginate(request, posts_list, counter=cached_count('index'))
 
     context = {
         'page_obj': page_obj
@@ -28,12 +35,13 @@ def index(request):
     return render(request, template, context)
 
 
+@conditional_page(group_version)
+@cache_page_tagged(group_tags)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts_list = group.posts.all()
-    paginator = Paginator(posts_list, N_POSTS_IN_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts_list = feed_rows(group.posts.all())
+    page_obj = paginate(request, posts_list,
+                        counter=cached_count(f'group:{group.pk}'))
 
     template = 'posts/group_list.html'
     context = {
@@ -43,32 +51,60 @@ def group_posts(request, slug):
     return render(request, template, context)
 
 
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    group = request.GET.get('group', '')
+    author = request.GET.get('author', '').strip()
+    posts_list = search(query, group=group, author=author)
+    page_obj = Paginator(posts_list, N_POSTS_IN_PAGE).get_page(
+        request.GET.get('page')
+    )
+    params = request.GET.copy()
+    params.pop('page', None)
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+        'group': group,
+        'author': author,
+        'groups': Group.objects.only('slug', 'title'),
+        'params': params.urlencode(),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@conditional_page(profile_version)
+@cache_page_tagged(profile_tags)
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    following = (request.user.is_authenticated
-                 and user.following.filter(user=request.user).exists())
-    posts_list = user.posts.all()
-    paginator = Paginator(posts_list, N_POSTS_IN_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    user = get_object_or_404(User.objects.select_related('stats'),
+                             username=username)
+    posts_list = feed_rows(user.posts.all())
+    page_obj = paginate(request, posts_list)
     context = {
         'author': user,
         'page_obj': page_obj,
-        'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_page(post_version)
+@cache_page_tagged(post_tags)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    user = User.objects.get(username=post.author)
-    form = CommentForm()
+    context = load_post_detail(post_id)
+    context['form'] = CommentForm()
+    return render(request, 'posts/post_detail.html', context)
+
+
+@cache_page_tagged(comments_tags)
+def post_comments(request, post_id):
+    try:
+        comments = comments_page(post_id, request.GET.get('after'))
+    except InvalidCursor:
+        return HttpResponseBadRequest('Неверный курсор')
     context = {
-        'form': form,
-        'post': post,
-        'author': user,
+        'post_id': post_id,
+        'comments': comments,
     }
-    return render(request, 'posts/post_detail.html', context)
+    return render(request, 'posts/includes/comments.html', context)
 
 
 @csrf_exempt
@@ -86,7 +122,9 @@ def post_create(request):
             if form.is_valid():
                 post = form.save(commit=False)
                 post.author = request.user
-                post.save()
+                with transaction.atomic():
+                    post.save()
+                    thumbnails.enqueue(post.image.name)
                 return redirect('posts:profile', username)
             return render(request, 'posts/create_post.html',
                           context=context)
@@ -105,7 +143,9 @@ def post_edit(request, post_id):
     if request.method == 'POST':
         if form.is_valid():
             post = form.save(commit=False)
-            post.save()
+            with transaction.atomic():
+                post.save()
+                thumbnails.enqueue(post.image.name)
             return redirect('posts:post_detail', post_id)
 
     context = {
@@ -124,17 +164,14 @@ def add_comment(request, post_id):
             comment = form.save(commit=False)
             comment.author = request.user
             comment.post = post
-            comment.save()
+            with transaction.atomic():
+                comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    user = request.user
-    following_posts = Post.objects.filter(author__following__user=user)
-    paginator = Paginator(following_posts, N_POSTS_IN_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = follow_page(request, request.user)
 
     context = {
         'page_obj': page_obj,
@@ -144,26 +181,14 @@ def follow_index(request):
 
 @login_required
 def profile_follow(request, username):
-    author = User.objects.get(username=username)
-
-    existing_follow = Follow.objects.filter(
-        user=request.user,
-        author=author,
-    )
-    if request.user != author and not existing_follow.exists():
-        Follow.objects.create(
-            user=request.user,
-            author=author,
-        )
+    author = get_object_or_404(User, username=username)
+    if request.user != author:
+        follows.follow(request.user, author)
     return redirect('posts:profile', username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    author = User.objects.get(username=username)
-    if request.user != author:
-        Follow.objects.get(
-            user=request.user,
-            author=author,
-        ).delete()
+    author = get_object_or_404(User, username=username)
+    follows.unfollow(request.user, author)
     return redirect('posts:profile', username)
@@ -101,6 +101,7 @@ USE_TZ = True
 
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
+STATICFILES_STORAGE = 'core.storage.ManifestStaticFilesStorage'
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -113,9 +114,70 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-
+# Загрузки именуются хэшем содержимого; миниатюры sorl именует сам.
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
+
+# Файлы с хэшем в имени кэшируются навсегда, остальные — на сутки.
+IMMUTABLE_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+FILE_CACHE_MAX_AGE = 60 * 60 * 24
+# Байты файлов может отдавать фронт-сервер: 'x-sendfile' (Apache,
+# lighttpd) или 'x-accel-redirect' (nginx, internal-локация с префиксом).
+SENDFILE_BACKEND = None
+SENDFILE_ACCEL_PREFIX = '/internal'
+
+# Кэш общий для всех процессов: сброс тегов страниц, замки перестройки
+# и версии для ETag должны быть видны каждому воркеру. Таблица
+# создаётся командой manage.py createcachetable.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'django_cache',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
     }
 }
+
+# Комментарии под постом подгружаются порциями по курсору.
+COMMENTS_PER_PAGE = 20
+# Тексты полей с compressed() от этой длины хранятся сжатыми.
+COMPRESSED_TEXT_MIN_LENGTH = 1024
+
+# Загруженная картинка ужимается до этой стороны; варианты для srcset.
+POST_IMAGE_MAX_SIDE = 2048
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+
+# Миниатюры строит воркер: manage.py thumbnail_worker.
+THUMBNAIL_BACKEND = 'posts.thumbnails.ThumbnailBackend'
+THUMBNAIL_ENGINE = 'posts.thumbnails.Engine'
+THUMBNAIL_KVSTORE = 'posts.thumbnails.KVStore'
+THUMBNAIL_WORKERS = 4
+THUMBNAIL_WORKER_POLL = 1
+THUMBNAIL_JOB_GUARD_TIMEOUT = 60 * 10
+# Задача после ошибки откладывается на RETRY_DELAY * 2 ** попытка секунд.
+THUMBNAIL_JOB_MAX_ATTEMPTS = 5
+THUMBNAIL_JOB_RETRY_DELAY = 60
+THUMBNAIL_JOB_LOCK_TIMEOUT = 60 * 10
+
+# Страницы сбрасываются по тегам при записи, поэтому срок жизни долгий.
+PAGE_CACHE_TIMEOUT = 60 * 60
+# Истёкшая страница отдаётся ещё столько секунд, пока её перестраивает
+# один запрос под замком; коэффициент досрочного истечения (XFetch).
+PAGE_CACHE_STALE_GRACE = 60
+PAGE_CACHE_EARLY_EXPIRY = 1.0
+PAGE_CACHE_LOCK_TIMEOUT = 10
+PAGE_CACHE_LOCK_WAIT = 2
+# Ключ карточки поста меняется вместе с её содержимым.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Размеры главной ленты и групп кэшируются и сдвигаются при записи,
+# после истечения их пересчитывает первый запрос; ленты подписок
+# считаются не дальше FEED_COUNT_CAP постов.
+FEED_COUNT_CACHE_TIMEOUT = 60 * 60
+FEED_COUNT_CAP = 1000
+
+# Авторы, у которых подписчиков или постов больше порога, не раскладываются
+# по лентам подписчиков при записи: их посты подмешиваются при чтении.
+TIMELINE_FANOUT_MAX_FOLLOWERS = 10000
+TIMELINE_FANOUT_MAX_POSTS = 5000
+TIMELINE_BATCH_SIZE = 500
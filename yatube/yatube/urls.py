@@ -1,7 +1,8 @@
 from django.contrib import admin
 from django.urls import include, path, re_path
 from django.conf import settings
-from django.views.static import serve 
+
+from core.files import serve_media, serve_static
 
 urlpatterns = (
     path('admin/', admin.site.urls),
@@ -23,6 +24,6 @@ if settings.DEBUG:
 
 else:
     urlpatterns += (
-        re_path(r'^media/(?P<path>.*)$', serve,{'document_root': settings.MEDIA_ROOT}), 
-        re_path(r'^static/(?P<path>.*)$', serve,{'document_root': settings.STATIC_ROOT}), 
+        re_path(r'^media/(?P<path>.*)$', serve_media),
+        re_path(r'^static/(?P<path>.*)$', serve_static),
     )
\ No newline at end of file